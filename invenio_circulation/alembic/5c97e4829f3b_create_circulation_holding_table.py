@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Create the circulation holding table.
+
+Existing items have to be backfilled afterwards with
+``circulation sync-holdings``.
+"""
+
+import sqlalchemy as sa
+import sqlalchemy_utils
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5c97e4829f3b'
+down_revision = '652b8b29cb66'
+branch_labels = ()
+depends_on = None
+
+
+def upgrade():
+    """Upgrade database."""
+    op.create_table(
+        'circulation_holding',
+        sa.Column(
+            'holding_id',
+            sqlalchemy_utils.types.uuid.UUIDType(),
+            nullable=False
+        ),
+        sa.Column(
+            'item_id',
+            sqlalchemy_utils.types.uuid.UUIDType(),
+            nullable=False
+        ),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('start_date', sa.Date(), nullable=True),
+        sa.Column('end_date', sa.Date(), nullable=True),
+        sa.Column('delivery', sa.String(length=255), nullable=True),
+        sa.Column('kind', sa.String(length=255), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['item_id'],
+            [u'records_metadata.id'],
+            ondelete='CASCADE'
+        ),
+        sa.PrimaryKeyConstraint('holding_id')
+    )
+    op.create_index(
+        'idx_circulation_holding_item_id_start_date', 'circulation_holding',
+        ['item_id', 'start_date'], unique=False
+    )
+    op.create_index(
+        op.f('ix_circulation_holding_user_id'), 'circulation_holding',
+        ['user_id'], unique=False
+    )
+
+
+def downgrade():
+    """Downgrade database."""
+    op.drop_index(op.f('ix_circulation_holding_user_id'),
+                  table_name='circulation_holding')
+    op.drop_index('idx_circulation_holding_item_id_start_date',
+                  table_name='circulation_holding')
+    op.drop_table('circulation_holding')
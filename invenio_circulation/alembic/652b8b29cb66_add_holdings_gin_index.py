@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Add GIN index on the item holdings."""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '652b8b29cb66'
+down_revision = '2510de3ef451'
+branch_labels = ()
+depends_on = None
+
+
+def upgrade():
+    """Upgrade database."""
+    # The expression has to match the one used by
+    # ``Item.find_by_holding(current_only=True)``.
+    op.execute(
+        'CREATE INDEX idx_records_metadata_circulation_holdings '
+        'ON records_metadata USING gin '
+        "((CAST(json AS JSONB) -> '_circulation' -> 'holdings') "
+        'jsonb_path_ops)'
+    )
+
+
+def downgrade():
+    """Downgrade database."""
+    op.drop_index('idx_records_metadata_circulation_holdings',
+                  table_name='records_metadata')
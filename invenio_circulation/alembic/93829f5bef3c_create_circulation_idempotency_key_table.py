@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Create the circulation idempotency key table."""
+
+import sqlalchemy as sa
+import sqlalchemy_utils
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '93829f5bef3c'
+down_revision = '5c97e4829f3b'
+branch_labels = ()
+depends_on = None
+
+
+def upgrade():
+    """Upgrade database."""
+    op.create_table(
+        'circulation_idempotency_key',
+        sa.Column('user_id', sa.Integer(), autoincrement=False,
+                  nullable=False),
+        sa.Column('receiver_id', sa.String(length=255), nullable=False),
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column(
+            'event_id',
+            sqlalchemy_utils.types.uuid.UUIDType(),
+            nullable=False
+        ),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.Column('response_code', sa.Integer(), nullable=True),
+        sa.Column(
+            'response',
+            sqlalchemy_utils.types.json.JSONType().with_variant(
+                postgresql.JSON(none_as_null=True),
+                'postgresql',
+            ),
+            nullable=True
+        ),
+        sa.PrimaryKeyConstraint('user_id', 'receiver_id', 'key')
+    )
+    op.create_index(
+        op.f('ix_circulation_idempotency_key_created'),
+        'circulation_idempotency_key', ['created'], unique=False
+    )
+
+
+def downgrade():
+    """Downgrade database."""
+    op.drop_index(op.f('ix_circulation_idempotency_key_created'),
+                  table_name='circulation_idempotency_key')
+    op.drop_table('circulation_idempotency_key')
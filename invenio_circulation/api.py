@@ -28,19 +28,38 @@ import collections
 import datetime
 import uuid
 from functools import partial, wraps
-from operator import indexOf
+from itertools import islice
 
 import six
 from flask import current_app
 from invenio_db import db
 from invenio_pidstore.errors import PIDInvalidAction
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_pidstore.resolver import Resolver
 from invenio_records.api import Record
 from invenio_records.models import RecordMetadata
-from sqlalchemy import BOOLEAN, DATE, INTEGER, cast, func, type_coerce
+from jsonschema.exceptions import ValidationError
+from sqlalchemy import BOOLEAN, DATE, INTEGER, and_, cast, column, exists, \
+    func, literal_column, select, tuple_, type_coerce
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy_continuum import version_class
 
-from invenio_circulation.models import ItemStatus
+from invenio_circulation.indexer import CirculationIndexer
+from invenio_circulation.metrics import phase
+from invenio_circulation.models import CirculationCheckpoint, \
+    CirculationHolding, HoldingKind, ItemStatus
+from invenio_circulation.proxies import current_circulation_policy
+from invenio_circulation.utils import LRUCache, schema_cache
+from invenio_circulation.validators import BaseSchema, CancelItemSchema, \
+    ExtendItemSchema, HoldingIntervals, LoanItemSchema, RequestItemSchema, \
+    ReturnItemSchema, ReturnMissingItemSchema
+
+_availability_cache = LRUCache(maxsize=4096)
+"""Free date ranges of items by id, revision and requested interval."""
+
+OVERDUE_CHECKPOINT = 'overdue-loans'
+"""Name of the checkpoint of :meth:`Item.mark_overdue_loans`."""
 
 
 def check_status(method=None, statuses=None):
@@ -60,6 +79,33 @@ def check_status(method=None, statuses=None):
     return wrapper
 
 
+def _find_circulation_schema(schema):
+    """Find the subschema of `_circulation` in an item schema."""
+    if '_circulation' in schema.get('properties', {}):
+        return schema['properties']['_circulation']
+    for subschema in schema.get('allOf', []):
+        found = _find_circulation_schema(subschema)
+        if found is not None:
+            return found
+    return None
+
+
+def circulation_validator(schema_url, **kwargs):
+    """Get the validator for the `_circulation` subtree.
+
+    :param schema_url: URL of the item JSON schema.
+    :param kwargs: Arguments of :meth:`SchemaCache.validator
+                   <invenio_circulation.utils.SchemaCache.validator>`.
+    :returns: A :class:`jsonschema.Draft4Validator` or None if the item
+              schema does not define `_circulation`.
+    """
+    schema, _ = schema_cache.get(schema_url)
+    subschema = _find_circulation_schema(schema)
+    if subschema is None:
+        return None
+    return schema_cache.validator(schema_url, subschema, **kwargs)
+
+
 class Holding(dict):
     """Holding class to create and maintain holdings."""
 
@@ -70,11 +116,16 @@ class Holding(dict):
 
 
 class HoldingIterator(object):
-    """Data access object to manage holdings associated to an item."""
+    """Data access object to manage holdings associated to an item.
+
+    Keeps an index of the holding ids to their position in the list, so
+    lookups and deletions by id do not have to scan the holdings.
+    """
 
     def __init__(self, iterable):
         """Initialize iterator."""
         self._iterable = iterable
+        self._index = None
 
     def __len__(self):
         """Get number of files."""
@@ -95,7 +146,7 @@ class HoldingIterator(object):
 
     def __contains__(self, id_):
         """Check if HoldingIterator contains a Holding by id."""
-        return id_ in (x['id'] for x in self)
+        return self._position(id_) is not None
 
     def __getitem__(self, key):
         """Get a specific file."""
@@ -104,60 +155,125 @@ class HoldingIterator(object):
     def __setitem__(self, key, obj):
         """Add file inside a deposit."""
         self._iterable[key] = obj   # pragma: no cover
+        self._index = None          # pragma: no cover
 
     def __delitem__(self, id_):
         """Delete a Holding by id.
 
         :raises ValueError:
         """
-        index = indexOf((x['id'] for x in self), str(id_))
-        del self._iterable[index]
+        index = self._position(id_)
+        if index is None:
+            raise ValueError('{0} is not in holdings.'.format(id_))
+        self.pop(index)
 
     def append(self, obj):
         """Append a holding to the end."""
         self._iterable.append(obj)
+        if self._index is not None:
+            self._index[str(obj['id'])] = len(self._iterable) - 1
 
     def insert(self, index, obj):
         """Insert a holding before given index."""
+        length = len(self._iterable)
+        index = max(0, length + index) if index < 0 else min(index, length)
         self._iterable.insert(index, obj)
+        if self._index is not None:
+            self._shift(index, 1)
+            self._index[str(obj['id'])] = index
 
-    def pop(self, index):
+    def pop(self, index=-1):
         """Remove and return a holding at index (default is last)."""
-        return self._iterable.pop(index)
+        if index < 0:
+            index += len(self._iterable)
+        obj = self._iterable.pop(index)
+        if self._index is not None:
+            self._index.pop(str(obj['id']), None)
+            self._shift(index, -1)
+        return obj
+
+    def _shift(self, start, offset):
+        """Move the indexed positions from `start` onwards by `offset`."""
+        for holding in self._iterable[start:]:
+            id_ = str(holding['id'])
+            if id_ in self._index:
+                self._index[id_] += offset
+
+    def _build_index(self):
+        """Map the ids of all holdings to their position."""
+        self._index = {str(x['id']): i for i, x in enumerate(self._iterable)}
+
+    def _position(self, id_):
+        """Get the position of the Holding with the given id or None.
+
+        The index is rebuilt if the underlying list was changed without
+        going through this object, i.e. if the lookup misses or points to
+        another holding.
+        """
+        id_ = str(id_)
+        if self._index is None or len(self._index) != len(self._iterable):
+            self._build_index()
+        index = self._index.get(id_)
+        if index is None or index >= len(self._iterable) or \
+                str(self._iterable[index]['id']) != id_:
+            self._build_index()
+            index = self._index.get(id_)
+        return index
+
+
+class CirculationRecord(Record):
+    """Record validated against the cached circulation schemas."""
 
+    def validate(self, **kwargs):
+        """Validate record according to schema defined in ``$schema`` key.
 
-class Location(Record):
+        :param kwargs: The ``validator`` class and ``format_checker`` to
+                       validate with.
+        """
+        if '$schema' in self:
+            schema_cache.validator(self['$schema'], **kwargs).validate(self)
+        return True
+
+
+class Location(CirculationRecord):
     """Data model to store location information."""
 
     @classmethod
-    def create(cls, data, id_=None):
+    def create(cls, data, id_=None, **kwargs):
         """Create a location instance and store it in database."""
         data = data or {}
         schema = current_app.config.get('CIRCULATION_LOCATION_SCHEMA', None)
 
         if schema:
-            ptu = current_app.extensions['invenio-jsonschemas'].path_to_url
-            data.setdefault('$schema', ptu(schema))
-        return super(Location, cls).create(data, id_=id_)
+            data.setdefault('$schema', schema_cache.url(schema))
+        return super(Location, cls).create(data, id_=id_, **kwargs)
 
 
-class Item(Record):
+class Item(CirculationRecord):
     """Data model to store holding information."""
 
+    find_chunk_size = 500
+    """Number of rows fetched at once when searching holdings."""
+
+    _circulation_only = False
+
     @property
     def holdings(self):
         """Property of holdings associated with the given item."""
-        return HoldingIterator(self['_circulation']['holdings'])
+        holdings = self['_circulation']['holdings']
+        iterator = getattr(self, '_holdings', None)
+        if iterator is None or iterator._iterable is not holdings:
+            iterator = self._holdings = HoldingIterator(holdings)
+        return iterator
 
     @classmethod
-    def create(cls, data, id_=None):
+    def create(cls, data, id_=None, **kwargs):
         """Create a location instance and store it in database."""
         data = data or {}
         schema = current_app.config.get('CIRCULATION_ITEM_SCHEMA', None)
 
         if schema:
-            ptu = current_app.extensions['invenio-jsonschemas'].path_to_url
-            data.setdefault('$schema', ptu(schema))
+            data.setdefault('$schema', schema_cache.url(schema))
         if '_circulation' not in data:
             data['_circulation'] = {'status': ItemStatus.ON_SHELF,
                                     'holdings': []}
@@ -165,33 +281,206 @@ class Item(Record):
             data['_circulation']['holdings'] = []
         if 'status' not in data:
             data['_circulation']['status'] = ItemStatus.ON_SHELF
-        return super(Item, cls).create(data, id_=id_)
+        return super(Item, cls).create(data, id_=id_, **kwargs)
+
+    @classmethod
+    def get_record_for_update(cls, id_):
+        """Get an item and lock it until the end of the transaction.
+
+        The item's row is locked with ``SELECT ... FOR UPDATE``, so that
+        concurrent circulation events on the same item are serialized.
+        """
+        with db.session.no_autoflush:
+            obj = RecordMetadata.query.filter(
+                RecordMetadata.id == id_,
+                RecordMetadata.json != None,  # noqa
+            ).with_for_update().populate_existing().one()
+            return cls(obj.json, model=obj)
+
+    @classmethod
+    def get_record_by_pid(cls, pid_value, for_update=False):
+        """Get an item by the value of its ``crcitm`` PID.
+
+        The PID and the item are fetched in a single query.
+
+        :param pid_value: Value of the item's PID, e.g. its barcode.
+        :param for_update: Lock the item as :meth:`get_record_for_update`.
+        :raises: The errors of :meth:`invenio_pidstore.resolver.Resolver.
+            resolve` if the PID does not resolve to an item.
+        """
+        query = db.session.query(RecordMetadata).join(
+            PersistentIdentifier,
+            PersistentIdentifier.object_uuid == RecordMetadata.id,
+        ).filter(
+            PersistentIdentifier.pid_type == 'crcitm',
+            PersistentIdentifier.pid_value == pid_value,
+            PersistentIdentifier.object_type == 'rec',
+            PersistentIdentifier.status == PIDStatus.REGISTERED,
+            RecordMetadata.json != None,  # noqa
+        )
+        if for_update:
+            query = query.with_for_update(of=RecordMetadata) \
+                .populate_existing()
+
+        with db.session.no_autoflush:
+            obj = query.one_or_none()
+        if obj is None:
+            # Raises the appropriate error
+            getter = cls.get_record_for_update if for_update else \
+                cls.get_record
+            return Resolver(pid_type='crcitm', object_type='rec',
+                            getter=getter).resolve(pid_value)[1]
+
+        return cls(obj.json, model=obj)
+
+    @classmethod
+    def get_circulation_states(cls, pid_values):
+        """Get the circulation state of items by the values of their PIDs.
+
+        Only the `_circulation` subtree is fetched, within a single read-only
+        query and without locking. The returned items have no model and can
+        be validated against, but not committed.
+
+        :param pid_values: Values of the items' ``crcitm`` PIDs.
+        :returns: Dictionary of the items by the values of registered PIDs.
+        """
+        if not pid_values:
+            return {}
+
+        query = db.session.query(
+            PersistentIdentifier.pid_value,
+            cast(RecordMetadata.json, JSONB)['_circulation'],
+        ).join(
+            RecordMetadata,
+            PersistentIdentifier.object_uuid == RecordMetadata.id,
+        ).filter(
+            PersistentIdentifier.pid_type == 'crcitm',
+            PersistentIdentifier.pid_value.in_(list(pid_values)),
+            PersistentIdentifier.object_type == 'rec',
+            PersistentIdentifier.status == PIDStatus.REGISTERED,
+            RecordMetadata.json != None,  # noqa
+        )
+        return {
+            pid_value: cls({'_circulation': circulation})
+            for pid_value, circulation in query
+        }
+
+    def validate(self, **kwargs):
+        """Validate the item according to its ``$schema``.
+
+        Only the `_circulation` subtree is validated while committing
+        circulation changes.
+        """
+        if self._circulation_only and '$schema' in self:
+            validator = circulation_validator(self['$schema'], **kwargs)
+            if validator is not None:
+                validator.validate(self['_circulation'])
+                return True
+        return super(Item, self).validate(**kwargs)
+
+    def commit(self, circulation_only=False, **kwargs):
+        """Store changes on current instance in database.
+
+        :param circulation_only: Only `_circulation` was changed, so only
+                                 this part of the item is validated instead
+                                 of the whole record.
+        :param kwargs: Arguments passed on to :meth:`validate`.
+        """
+        self._circulation_only = circulation_only
+        try:
+            return super(Item, self).commit(**kwargs)
+        finally:
+            self._circulation_only = False
 
     @classmethod
-    def find_by_holding(cls, **kwargs):
+    def find_by_holding(cls, current_only=False, after=None, limit=None,
+                        **kwargs):
         """Find item versions based on their holdings information.
 
         Every given kwarg will be queried as a key-value pair in the items
-        holding.
-
+        holding. The results are streamed from a server side cursor.
+
+        :param current_only: Only query the current version of the items.
+                             The lookup uses JSONB containment on the
+                             holdings, which is backed by a GIN index.
+                             Otherwise all versions of the items are
+                             queried.
+        :param after: `(UUID, version_id)` of the last result of the
+                      previous page. Results are ordered by id and version
+                      if either `after` or `limit` is given.
+        :param limit: Maximum number of results.
         :returns: List[(UUID, version_id)] with `version_id` as used by
                   `RecordMetadata.version_id`.
         """
-        def _get_filter_clause(obj, key, value):
-            val = obj[key].astext
-            CASTS = {
-                bool: lambda x: cast(x, BOOLEAN),
-                int: lambda x: cast(x, INTEGER),
-                datetime.date: lambda x: cast(x, DATE),
-            }
+        ranges = {}
+        values = {}
+        for key, value in kwargs.items():
             if (not isinstance(value, six.string_types) and
                     isinstance(value, collections.Sequence)):
-                if len(value) == 2:
-                    return CASTS[type(value[0])](val).between(*value)
-                raise ValueError('Too few/many values for a range query. '
-                                 'Range query requires two values.')
-            return CASTS.get(type(value), lambda x: x)(val) == value
+                if len(value) != 2:
+                    raise ValueError('Too few/many values for a range query. '
+                                     'Range query requires two values.')
+                ranges[key] = value
+            else:
+                values[key] = value
+
+        if current_only:
+            model = RecordMetadata
+            query = cls._find_current_by_holding(ranges, values)
+        else:
+            model = version_class(RecordMetadata)
+            query = cls._find_versions_by_holding(ranges, values)
+
+        if after is not None or limit is not None:
+            query = query.order_by(model.id, model.version_id)
+        if after is not None:
+            query = query.filter(
+                tuple_(model.id, model.version_id) > tuple_(*after)
+            )
+        if limit is not None:
+            query = query.limit(limit)
+
+        for result in query.yield_per(cls.find_chunk_size):
+            yield result
+
+    @classmethod
+    def find_items_by_holding(cls, chunk_size=None, **kwargs):
+        """Find the current items based on their holdings information.
+
+        Takes the same holding arguments as :meth:`find_by_holding` and
+        fetches the matching items with one query per chunk of results.
 
+        :param chunk_size: Number of items fetched at once.
+        :returns: Iterator of :class:`Item`.
+        """
+        chunk_size = chunk_size or cls.find_chunk_size
+        results = cls.find_by_holding(current_only=True, **kwargs)
+        while True:
+            ids = [id_ for id_, _ in islice(results, chunk_size)]
+            if not ids:
+                return
+            items = {item.id: item for item in cls.get_records(ids)}
+            for id_ in ids:
+                if id_ in items:
+                    yield items[id_]
+
+    @staticmethod
+    def _get_filter_clause(obj, key, value):
+        """Get the clause comparing a holding value of `obj`."""
+        val = obj[key].astext
+        CASTS = {
+            bool: lambda x: cast(x, BOOLEAN),
+            int: lambda x: cast(x, INTEGER),
+            datetime.date: lambda x: cast(x, DATE),
+        }
+        if (not isinstance(value, six.string_types) and
+                isinstance(value, collections.Sequence)):
+            return CASTS[type(value[0])](val).between(*value)
+        return CASTS.get(type(value), lambda x: x)(val) == value
+
+    @classmethod
+    def _find_versions_by_holding(cls, ranges, values):
+        """Query the holdings of all item versions."""
         RecordMetadataVersion = version_class(RecordMetadata)
 
         data = type_coerce(RecordMetadataVersion.json, JSONB)
@@ -205,17 +494,233 @@ class Item(Record):
 
         obj = type_coerce(subquery.c.obj, JSONB)
 
-        query = db.session.query(
+        kwargs = dict(values, **ranges)
+        return db.session.query(
             RecordMetadataVersion.id,
             RecordMetadataVersion.version_id
         ).filter(
             RecordMetadataVersion.id == subquery.c.id,
             RecordMetadataVersion.version_id == subquery.c.version_id,
-            *(_get_filter_clause(obj, k, v) for k, v in kwargs.items())
+            *(cls._get_filter_clause(obj, k, v) for k, v in kwargs.items())
         )
 
-        for result in query:
-            yield result
+    @classmethod
+    def _find_current_by_holding(cls, ranges, values):
+        """Query the holdings of the current item versions.
+
+        The equality checks are expressed as JSONB containment, so that the
+        GIN index on the holdings preselects the records. Range checks are
+        evaluated on the elements of the preselected records only.
+        """
+        holdings = cast(RecordMetadata.json, JSONB)[
+            '_circulation'
+        ]['holdings']
+        contained = [{
+            k: v.isoformat() if isinstance(v, datetime.date) else v
+            for k, v in values.items()
+        }]
+
+        query = db.session.query(
+            RecordMetadata.id,
+            RecordMetadata.version_id
+        ).filter(
+            RecordMetadata.json != None,  # noqa
+            holdings.contains(contained),
+        )
+
+        if ranges:
+            elements = func.jsonb_array_elements(holdings).alias('obj')
+            obj = type_coerce(column('obj', JSONB), JSONB)
+            query = query.filter(exists(
+                select([literal_column('1')]).select_from(elements).where(
+                    and_(obj.contains(contained[0]),
+                         *(cls._get_filter_clause(obj, k, v)
+                           for k, v in ranges.items()))
+                )
+            ))
+
+        return query
+
+    @classmethod
+    def get_records_for_update(cls, ids):
+        """Get items and lock them until the end of the transaction.
+
+        The rows are locked in the order of their UUIDs, so that concurrent
+        bulk changes cannot deadlock each other.
+        """
+        with db.session.no_autoflush:
+            query = RecordMetadata.query.filter(
+                RecordMetadata.id.in_(ids),
+                RecordMetadata.json != None,  # noqa
+            ).order_by(RecordMetadata.id).with_for_update().populate_existing()
+            return [cls(obj.json, model=obj) for obj in query.all()]
+
+    @classmethod
+    def bulk_apply(cls, action, arguments):
+        """Apply a circulation action to several items at once.
+
+        Items given by their UUIDs are locked and fetched with a single
+        query. Each set of arguments is validated with the schema of the
+        action and applied in a savepoint of its own, so that the valid items
+        are changed even if others fail. The changed items are handed to the
+        circulation indexer together.
+
+        :param action: Name of the circulation action, see
+                       :data:`CIRCULATION_ACTIONS`.
+        :param arguments: List[(item, dict)] of locked items or item UUIDs
+                          and the arguments for the action.
+        :returns: List[(UUID, error)] in the order of `arguments`, where
+                  `error` is None if the action succeeded and otherwise a
+                  dictionary with the ``status`` code and a ``message``.
+        """
+        schema_class, run = CIRCULATION_ACTIONS[action]
+
+        ids = [id_ for id_, _ in arguments if not isinstance(id_, Record)]
+        items = {}
+        if ids:
+            with phase('resolve'):
+                items = {str(item.id): item
+                         for item in cls.get_records_for_update(ids)}
+
+        results = []
+        changed = []
+        for item, kwargs in arguments:
+            if isinstance(item, Record):
+                id_ = item.id
+            else:
+                id_, item = item, items.get(str(item))
+            if item is None:
+                results.append((id_, {'status': 404,
+                                      'message': 'The item does not exist.'}))
+                continue
+
+            schema = schema_class(context={'item': item})
+            with phase('validate'):
+                data, errors = schema.load(kwargs)
+            if errors:
+                results.append((id_, {'status': 400, 'message': errors}))
+                continue
+
+            if data.get('dry_run'):
+                results.append((id_, None))
+                continue
+
+            data, _ = schema.dump(data)
+            try:
+                with phase('commit'), db.session.begin_nested():
+                    run(item, data)
+                    item.commit(circulation_only=True)
+            except (PIDInvalidAction, ValidationError) as e:
+                results.append((id_, {'status': 400, 'message': str(e)}))
+                continue
+            except StaleDataError:
+                results.append((id_, {
+                    'status': 409,
+                    'message': 'The item was changed concurrently.',
+                }))
+                continue
+
+            changed.append(item)
+            results.append((id_, None))
+
+        if changed:
+            with phase('index'):
+                CirculationIndexer().index(changed)
+
+        return results
+
+    @classmethod
+    def mark_overdue_loans(cls, today=None, batch_size=None):
+        """Mark the loans ended before today as overdue.
+
+        The loans are found with the `kind` and `end_date` index of
+        :class:`invenio_circulation.models.CirculationHolding` and handled in
+        batches ordered by end date. Each batch is committed in its own
+        transaction together with the position of its last loan, so that
+        an interrupted run resumes after the last committed batch and
+        the next runs only look at loans ended since.
+
+        :param today: Date before which loans are overdue.
+            (Default: today of the circulation policy)
+        :param batch_size: Number of loans per transaction.
+            (Default: ``CIRCULATION_OVERDUE_BATCH_SIZE``)
+        :returns: Number of items marked as overdue.
+        """
+        today = today or current_circulation_policy.today()
+        batch_size = batch_size or \
+            current_app.config['CIRCULATION_OVERDUE_BATCH_SIZE']
+        position = CirculationCheckpoint.get(OVERDUE_CHECKPOINT)
+
+        count = 0
+        while True:
+            query = db.session.query(
+                CirculationHolding.end_date,
+                CirculationHolding.holding_id,
+                CirculationHolding.item_id,
+            ).filter(
+                CirculationHolding.kind == HoldingKind.LOAN,
+                CirculationHolding.end_date < today,
+            )
+            if position is not None:
+                query = query.filter(tuple_(
+                    CirculationHolding.end_date,
+                    CirculationHolding.holding_id,
+                ) > tuple_(
+                    current_circulation_policy.parse_date(position[0]),
+                    uuid.UUID(position[1]),
+                ))
+            rows = query.order_by(
+                CirculationHolding.end_date, CirculationHolding.holding_id,
+            ).limit(batch_size).all()
+            if not rows:
+                break
+
+            with db.session.no_autoflush:
+                models = RecordMetadata.query.filter(
+                    RecordMetadata.id.in_(set(row.item_id for row in rows)),
+                    RecordMetadata.json != None,  # noqa
+                ).order_by(RecordMetadata.id).with_for_update() \
+                    .populate_existing().all()
+
+            changed = []
+            for model in models:
+                item = cls(model.json, model=model)
+                if item['_circulation']['status'] == ItemStatus.ON_LOAN:
+                    item.mark_overdue()
+                    item.commit(circulation_only=True)
+                    changed.append(item)
+
+            end_date, holding_id, _ = rows[-1]
+            position = [end_date.isoformat(), str(holding_id)]
+            CirculationCheckpoint.set(OVERDUE_CHECKPOINT, position)
+            if changed:
+                CirculationIndexer().index(changed)
+            db.session.commit()
+            count += len(changed)
+        return count
+
+    def availability(self, start, end):
+        """Get the date ranges in which the item can be held.
+
+        The result is cached per item revision, so it has to be called on
+        committed items only.
+
+        :param start: First date of the queried interval.
+        :param end: Last date of the queried interval.
+        :returns: List[(start, end)] of the free date ranges.
+        """
+        if self['_circulation']['status'] == ItemStatus.MISSING:
+            return []
+
+        if self.model is None:
+            return HoldingIntervals(self.holdings).free(start, end)
+
+        key = (self.id, self.revision_id, self.updated, start, end)
+        ranges = _availability_cache.get(key)
+        if ranges is None:
+            ranges = HoldingIntervals(self.holdings).free(start, end)
+            _availability_cache.set(key, ranges)
+        return ranges
 
     @check_status(statuses=[ItemStatus.ON_SHELF])
     def loan_item(self, **kwargs):
@@ -231,9 +736,12 @@ class Item(Record):
         :param delivery: 'pickup' or 'mail'
         """
         self['_circulation']['status'] = ItemStatus.ON_LOAN
-        self.holdings.insert(0, Holding.create(**kwargs))
+        holding = Holding.create(**kwargs)
+        self.holdings.insert(0, holding)
+        CirculationHolding.create(self.id, holding, HoldingKind.LOAN)
 
     @check_status(statuses=[ItemStatus.ON_LOAN,
+                            ItemStatus.OVERDUE,
                             ItemStatus.ON_SHELF])
     def request_item(self, **kwargs):
         """Request item for the user.
@@ -248,9 +756,12 @@ class Item(Record):
                          be put on a waitlist.
         :param delivery: 'pickup' or 'mail'
         """
-        self.holdings.append(Holding.create(**kwargs))
+        holding = Holding.create(**kwargs)
+        self.holdings.append(holding)
+        CirculationHolding.create(self.id, holding, HoldingKind.REQUEST)
 
-    @check_status(statuses=[ItemStatus.ON_LOAN])
+    @check_status(statuses=[ItemStatus.ON_LOAN,
+                            ItemStatus.OVERDUE])
     def return_item(self):
         """Return given item.
 
@@ -258,9 +769,11 @@ class Item(Record):
         """
         self['_circulation']['status'] = ItemStatus.ON_SHELF
 
-        self.holdings.pop(0)
+        holding = self.holdings.pop(0)
+        CirculationHolding.remove(holding['id'])
 
     @check_status(statuses=[ItemStatus.ON_LOAN,
+                            ItemStatus.OVERDUE,
                             ItemStatus.ON_SHELF])
     def lose_item(self):
         """Lose the given item.
@@ -270,7 +783,8 @@ class Item(Record):
         """
         self['_circulation']['status'] = ItemStatus.MISSING
 
-        for holding in self.holdings:
+        # Cancel from the end, so no remaining holding changes its position
+        for holding in reversed(list(self.holdings)):
             self.cancel_hold(holding['id'])
 
     @check_status(statuses=[ItemStatus.MISSING])
@@ -288,8 +802,10 @@ class Item(Record):
         This action updates the waitlist.
         """
         del self.holdings[id_]
+        CirculationHolding.remove(id_)
 
-    @check_status(statuses=[ItemStatus.ON_LOAN])
+    @check_status(statuses=[ItemStatus.ON_LOAN,
+                            ItemStatus.OVERDUE])
     def extend_loan(self, requested_end_date=None):
         """Request a new end date for the active loan.
 
@@ -298,3 +814,33 @@ class Item(Record):
         self['_circulation']['status'] = ItemStatus.ON_LOAN
 
         self.holdings[0]['end_date'] = requested_end_date
+        CirculationHolding.update(self.holdings[0]['id'],
+                                  end_date=requested_end_date)
+
+    @check_status(statuses=[ItemStatus.ON_LOAN])
+    def mark_overdue(self):
+        """Mark the active loan as overdue.
+
+        The item's status will be set to ItemStatus.OVERDUE.
+        """
+        self['_circulation']['status'] = ItemStatus.OVERDUE
+
+
+CIRCULATION_ACTIONS = {
+    'loan_item': (LoanItemSchema,
+                  lambda item, data: item.loan_item(**data)),
+    'request_item': (RequestItemSchema,
+                     lambda item, data: item.request_item(**data)),
+    'return_item': (ReturnItemSchema,
+                    lambda item, _: item.return_item()),
+    'lose_item': (BaseSchema,
+                  lambda item, _: item.lose_item()),
+    'return_missing_item': (ReturnMissingItemSchema,
+                            lambda item, _: item.return_missing_item()),
+    'cancel_hold': (CancelItemSchema,
+                    lambda item, data: item.cancel_hold(data['hold_id'])),
+    'extend_loan': (ExtendItemSchema,
+                    lambda item, data: item.extend_loan(
+                        data['requested_end_date'])),
+}
+"""Circulation actions mapped to their argument schema and item method."""
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Click command-line interface for circulation."""
+
+from __future__ import absolute_import, print_function
+
+import datetime
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from invenio_db import db
+
+from .api import Item
+from .indexer import CirculationIndexer, item_id_chunks
+from .models import CirculationHolding
+from .tasks import reindex_items
+
+
+def abort_if_false(ctx, param, value):
+    """Abort command if value is False."""
+    if not value:
+        ctx.abort()
+
+
+def parse_since(ctx, param, value):
+    """Parse a UTC date or datetime."""
+    if value is None:
+        return None
+    for date_format in ('%Y-%m-%d', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    raise click.BadParameter('Use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS.')
+
+
+@click.group()
+def circulation():
+    """Circulation management commands."""
+
+
+@circulation.command()
+@click.option('--since', callback=parse_since,
+              help='Only reindex items updated since this UTC date.')
+@click.option('--chunk-size', '-s', type=int, default=None,
+              help='Number of items per bulk request.')
+@click.option('--delayed', '-d', is_flag=True,
+              help='Index the chunks on Celery workers.')
+@click.option('--yes-i-know', is_flag=True, callback=abort_if_false,
+              expose_value=False,
+              prompt='Do you really want to reindex the circulation items?')
+@with_appcontext
+def reindex(since, chunk_size, delayed):
+    """Reindex the circulation items in bulk.
+
+    The items are read in chunks of their UUIDs and every chunk is indexed
+    with one bulk request, either here or on the Celery workers.
+
+    NOTE: Deleted items are not removed from the index.
+    """
+    chunk_size = chunk_size or \
+        current_app.config['CIRCULATION_REINDEX_CHUNK_SIZE']
+    indexer = CirculationIndexer()
+
+    start = time.time()
+    count = errors = 0
+    for ids in item_id_chunks(since=since, chunk_size=chunk_size):
+        count += len(ids)
+        if delayed:
+            reindex_items.delay([str(id_) for id_ in ids])
+            continue
+
+        errors += indexer.reindex(ids)[1]
+        db.session.expunge_all()
+        elapsed = time.time() - start
+        click.echo('Indexed {0} items ({1:.0f} items/s), {2} errors.'.format(
+            count, count / max(elapsed, 1e-6), errors))
+
+    elapsed = time.time() - start
+    if delayed:
+        click.secho('Sent {0} items to the indexing workers in {1:.1f}s.'
+                    .format(count, elapsed), fg='green')
+        return
+
+    click.secho('Indexed {0} items in {1:.1f}s ({2:.0f} items/s).'.format(
+        count, elapsed, count / max(elapsed, 1e-6)), fg='green')
+    if errors:
+        click.secho('{0} documents could not be indexed.'.format(errors),
+                    fg='red')
+        raise click.Abort()
+
+
+@circulation.command('sync-holdings')
+@click.option('--chunk-size', '-s', type=int, default=None,
+              help='Number of items per transaction.')
+@with_appcontext
+def sync_holdings(chunk_size):
+    """Backfill the holding table from the holdings of all items.
+
+    Run it once after creating the ``circulation_holding`` table, so that
+    the holdings of existing items can be found by user and date.
+    """
+    chunk_size = chunk_size or \
+        current_app.config['CIRCULATION_REINDEX_CHUNK_SIZE']
+
+    count = 0
+    for ids in item_id_chunks(chunk_size=chunk_size):
+        for item in Item.get_records(ids):
+            CirculationHolding.sync(item)
+        db.session.commit()
+        db.session.expunge_all()
+        count += len(ids)
+        click.echo('Synchronized the holdings of {0} items.'.format(count))
@@ -19,6 +19,9 @@
 
 """Invenio circulation configuration file."""
 
+from datetime import timedelta
+
+from kombu import Exchange, Queue
 
 CIRCULATION_EMAIL_SENDER = None
 CIRCULATION_LOAN_PERIOD = 28
@@ -44,20 +47,60 @@ CIRCULATION_REST_ENDPOINTS = {
         'search_index': None,
         'search_type': None,
         'search_serializers': {
-            'application/json': ('invenio_records_rest.serializers'
-                                 ':json_v1_search'),
+            'application/json': ('invenio_circulation.serializers'
+                                 ':json_v1_item_search'),
         },
         'list_route': '/circulation/items/',
         'item_route': '/circulation/items/<pid(crcitm):pid_value>',
         'default_media_type': 'application/json',
         'max_result_window': 10000,
-    }
+    },
+    'crcitmst': {
+        'pid_type': 'crcitm',
+        'pid_minter': 'circulation_item',
+        'pid_fetcher': 'circulation_item',
+        'create_permission_factory_imp': ('invenio_records_rest.utils'
+                                          ':deny_all'),
+        'update_permission_factory_imp': ('invenio_records_rest.utils'
+                                          ':deny_all'),
+        'delete_permission_factory_imp': ('invenio_records_rest.utils'
+                                          ':deny_all'),
+        'record_serializers': {
+            'application/json': ('invenio_records_rest.serializers'
+                                 ':json_v1_response'),
+        },
+        'search_class': 'invenio_circulation.search:ItemStateSearch',
+        'search_index': None,
+        'search_type': None,
+        'search_factory_imp': ('invenio_circulation.search'
+                               ':user_holdings_search_factory'),
+        'search_serializers': {
+            'application/json': ('invenio_circulation.serializers'
+                                 ':json_v1_holdings_search'),
+        },
+        'list_route': '/circulation/item-states/',
+        'item_route': '/circulation/item-states/<pid(crcitm):pid_value>',
+        'default_media_type': 'application/json',
+        'max_result_window': 10000,
+    },
 }
 """Basic REST circulation configuration."""
 
 CIRCULATION_ITEM_SEARCH_API = '/api/circulation/items/'
 """Configure the item search engine endpoint."""
 
+CIRCULATION_USER_HOLDINGS_API = '/api/circulation/users/{0}/holdings'
+"""Configure the endpoint of the loans and requests of a user."""
+
+CIRCULATION_USER_HOLDINGS_SIZE = 25
+"""Default number of holdings per page of the user holdings endpoint."""
+
+CIRCULATION_USER_HOLDINGS_MAX_SIZE = 100
+"""Maximum number of holdings per page of the user holdings endpoint."""
+
+CIRCULATION_AVAILABILITY_PERIOD = 90
+"""Number of days for which the item availability is listed by default."""
+
 CIRCULATION_USER_SEARCH_API = '/api/users/'
 """Configure the user search engine endpoint."""
 
@@ -72,4 +115,72 @@ CIRCULATION_ACTION_LOSE_URL = '/api/hooks/receivers/circulation_lose/events/'
 CIRCULATION_ACTION_CANCEL_URL = \
     '/api/hooks/receivers/circulation_cancel/events/'
 
-CIRCULATION_USER_HUB_QUERY = '_circulation.holdings.user_id:'
+CIRCULATION_RECEIVER_RETRIES = 3
+"""Number of retries of a circulation event after a deadlock or stale item."""
+
+CIRCULATION_RECEIVER_RETRY_BACKOFF = 0.05
+"""Seconds to wait before the first retry, doubled for every retry."""
+
+CIRCULATION_RECEIVER_ASYNC = False
+"""Process circulation events on Celery workers instead of in the request."""
+
+CIRCULATION_RECEIVER_QUEUE = 'circulation'
+"""Prefix of the Celery queues of asynchronous circulation events."""
+
+CIRCULATION_RECEIVER_PARTITIONS = 8
+"""Number of queues the circulation events are partitioned into by item.
+
+Each queue, e.g. ``circulation.0``, should be consumed by exactly one worker
+process to keep the events of an item in order.
+"""
+
+CIRCULATION_IDEMPOTENCY_TTL = timedelta(hours=24)
+"""Time during which the response to an idempotency key is replayed."""
+
+CIRCULATION_IDEMPOTENCY_PURGE_INTERVAL = timedelta(hours=1)
+"""Interval in which the Celery beat deletes expired idempotency keys."""
+
+CIRCULATION_OVERDUE_INTERVAL = timedelta(hours=1)
+"""Interval in which the Celery beat marks ended loans as overdue."""
+
+CIRCULATION_OVERDUE_BATCH_SIZE = 500
+"""Number of loans marked as overdue per transaction."""
+
+CIRCULATION_ITEM_STATE_INDEX = 'circulation-item-state'
+"""Index of the circulation state of the items.
+
+Circulation events only update this index, while the index of the whole items
+is only updated with their bibliographic data and leaves out their circulation
+state. Item search results get it from this index. Set to None to index whole
+items on circulation events instead.
+"""
+
+CIRCULATION_ITEM_STATE_DOC_TYPE = 'item-state-v1.0.0'
+"""Document type of the circulation state of the items."""
+
+CIRCULATION_REINDEX_CHUNK_SIZE = 1000
+"""Number of items per bulk request of ``circulation reindex``."""
+
+CIRCULATION_INDEXER_DEFERRED = True
+"""Index changed items in bulk after the transaction has been committed."""
+
+CIRCULATION_INDEXER_MQ_EXCHANGE = Exchange(
+    'circulation-indexer', type='direct')
+"""Exchange of the deferred circulation indexer."""
+
+CIRCULATION_INDEXER_MQ_QUEUE = Queue(
+    'circulation-indexer', exchange=CIRCULATION_INDEXER_MQ_EXCHANGE,
+    routing_key='circulation-indexer')
+"""Queue of the items waiting for the deferred circulation indexer."""
+
+CIRCULATION_INDEXER_BATCH_SIZE = 500
+"""Maximum number of queued items coalesced into one bulk request."""
+
+CIRCULATION_INDEXER_FLUSH_INTERVAL = timedelta(seconds=5)
+"""Interval in which the Celery beat flushes the circulation indexer queue."""
+
+CIRCULATION_METRICS_ENABLED = False
+"""Record the latency and SQL statements of the circulation events."""
+
+CIRCULATION_METRICS_URL = '/circulation/metrics'
+"""URL of the circulation metrics in the Prometheus text format."""
@@ -26,7 +26,18 @@
 
 from __future__ import absolute_import, print_function
 
+from invenio_indexer.signals import before_record_index
+from invenio_records.signals import after_record_delete, after_record_insert
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
 from . import config
+from .indexer import after_commit, after_transaction_end, delete_item_state, \
+    index_item_state, strip_circulation_state
+from .metrics import count_statement
+from .policy import CirculationPolicy
+from .utils import schema_cache
 from .views import rest
 
 
@@ -41,6 +52,10 @@ class InvenioCirculation(object):
     def init_app(self, app):
         """Flask application initialization."""
         self.init_config(app)
+        self.init_policy(app)
+        self.init_schemas(app)
+        self.init_indexer(app)
+        self.init_schedule(app)
         app.extensions['invenio-circulation'] = self
 
     def init_config(self, app):
@@ -54,6 +69,63 @@ class InvenioCirculation(object):
             if k.startswith('CIRCULATION_'):
                 app.config.setdefault(k, getattr(config, k))
 
+    def init_policy(self, app, today=None):
+        """Resolve the circulation policy from the configuration.
+
+        :param today: Callable returning the current date, e.g. to validate
+            circulation events as of another day.
+        """
+        app.extensions['invenio-circulation-policy'] = \
+            CirculationPolicy.from_config(app.config, today=today)
+
+    def init_schemas(self, app):
+        """Load the circulation JSON schemas into the schema cache.
+
+        The schemas are loaded on first use instead if Invenio-Records or
+        Invenio-JSONSchemas are not initialized yet.
+        """
+        if 'invenio-records' not in app.extensions or \
+                'invenio-jsonschemas' not in app.extensions:
+            return
+
+        with app.app_context():
+            for key in ('CIRCULATION_ITEM_SCHEMA',
+                        'CIRCULATION_LOCATION_SCHEMA'):
+                if app.config.get(key):
+                    schema_cache.get(schema_cache.url(app.config[key]))
+
+    def init_indexer(self, app):
+        """Publish the items changed in a transaction after its commit."""
+        if not event.contains(Session, 'after_commit', after_commit):
+            event.listen(Session, 'after_commit', after_commit)
+            event.listen(Session, 'after_transaction_end',
+                         after_transaction_end)
+        after_record_insert.connect(index_item_state)
+        after_record_delete.connect(delete_item_state)
+        before_record_index.connect(strip_circulation_state)
+
+    def init_schedule(self, app):
+        """Schedule the periodic circulation tasks on the Celery beat."""
+        schedule = app.config.setdefault('CELERYBEAT_SCHEDULE', {})
+        schedule.setdefault('circulation-idempotency-keys', {
+            'task': 'invenio_circulation.tasks.purge_idempotency_keys',
+            'schedule': app.config['CIRCULATION_IDEMPOTENCY_PURGE_INTERVAL'],
+        })
+        schedule.setdefault('circulation-overdue-loans', {
+            'task': 'invenio_circulation.tasks.mark_overdue_loans',
+            'schedule': app.config['CIRCULATION_OVERDUE_INTERVAL'],
+        })
+        if app.config['CIRCULATION_INDEXER_DEFERRED']:
+            schedule.setdefault('circulation-indexer', {
+                'task': 'invenio_circulation.tasks.process_index_queue',
+                'schedule': app.config['CIRCULATION_INDEXER_FLUSH_INTERVAL'],
+            })
+
+    @staticmethod
+    def invalidate_schemas():
+        """Drop all cached JSON schemas, e.g. after they have changed."""
+        schema_cache.invalidate()
+
 
 class InvenioCirculationREST(InvenioCirculation):
     """Invenio-Circulation extension."""
@@ -61,10 +133,28 @@ class InvenioCirculationREST(InvenioCirculation):
     def init_app(self, app):
         """Flask application initialization."""
         self.init_config(app)
+        self.init_policy(app)
+        self.init_schemas(app)
+        self.init_indexer(app)
+        self.init_schedule(app)
         app.register_blueprint(rest.create_blueprint(
             app.config['CIRCULATION_REST_ENDPOINTS']
         ))
+        self.init_metrics(app)
         app.config['RECORDS_REST_ENDPOINTS'].update(
             app.config['CIRCULATION_REST_ENDPOINTS']
         )
         app.extensions['invenio-circulation-rest'] = self
+
+    def init_metrics(self, app):
+        """Count SQL statements and expose the metrics of the events."""
+        if not app.config['CIRCULATION_METRICS_ENABLED']:
+            return
+
+        if not event.contains(Engine, 'before_cursor_execute',
+                              count_statement):
+            event.listen(Engine, 'before_cursor_execute', count_statement)
+
+        if app.config['CIRCULATION_METRICS_URL']:
+            app.add_url_rule(app.config['CIRCULATION_METRICS_URL'],
+                             'circulation_metrics', rest.metrics_view)
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Deferred bulk indexing of circulation items."""
+
+from __future__ import absolute_import, print_function
+
+from collections import OrderedDict
+from itertools import islice
+
+from celery.messaging import establish_connection
+from elasticsearch.helpers import bulk
+from flask import current_app
+from invenio_db import db
+from invenio_indexer.api import RecordIndexer
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.api import Record
+from invenio_records.models import RecordMetadata
+from invenio_search import current_search_client
+from kombu import Producer
+from kombu.compat import Consumer
+
+
+class CirculationIndexer(object):
+    """Coalescing indexer for circulation items.
+
+    Items changed within a transaction are published to a message queue
+    once it has been committed. Consuming the queue indexes every item only
+    once per batch, however often it has changed.
+
+    With `CIRCULATION_ITEM_STATE_INDEX` only a small document with the
+    circulation state of the items is indexed, instead of the whole record.
+    The indexed records then leave out their circulation state, see
+    :func:`strip_circulation_state`.
+    """
+
+    session_key = 'circulation_indexer'
+    """Key of the changed items in the session info."""
+
+    def __init__(self, queue=None, record_indexer=None, search_client=None):
+        """Initialize the indexer.
+
+        :param queue: A :class:`kombu.Queue` instance for the message queue.
+            (Default: ``CIRCULATION_INDEXER_MQ_QUEUE``)
+        :param record_indexer: The indexer of the whole items.
+        :param search_client: Elasticsearch client for the state documents.
+            (Default: ``current_search_client``)
+        """
+        self._queue = queue
+        self.record_indexer = record_indexer or RecordIndexer()
+        self.client = search_client or current_search_client
+
+    @property
+    def mq_queue(self):
+        """Message Queue queue."""
+        return self._queue or \
+            current_app.config['CIRCULATION_INDEXER_MQ_QUEUE']
+
+    def index(self, items, session=None):
+        """Index items once the current transaction has been committed.
+
+        Without `CIRCULATION_INDEXER_DEFERRED` the items are indexed right
+        away instead.
+        """
+        if not current_app.config['CIRCULATION_INDEXER_DEFERRED']:
+            if self.state_index:
+                self.index_states(items)
+            else:
+                self.index_records(items)
+            return
+
+        session = session or db.session
+        pending = session.info.setdefault(self.session_key, OrderedDict())
+        for item in items:
+            pending[str(item.id)] = None
+
+    def publish(self, item_ids):
+        """Publish item identifiers to the message queue."""
+        with establish_connection() as conn:
+            producer = Producer(
+                conn,
+                exchange=self.mq_queue.exchange,
+                routing_key=self.mq_queue.routing_key,
+                auto_declare=True,
+            )
+            for id_ in item_ids:
+                producer.publish({'id': str(id_)})
+
+    def process_queue(self, batch_size=None):
+        """Bulk index the queued items.
+
+        :param batch_size: Maximum number of messages coalesced into one bulk
+            request. (Default: ``CIRCULATION_INDEXER_BATCH_SIZE``)
+        :returns: The number of items sent to the indexer.
+        """
+        batch_size = batch_size or \
+            current_app.config['CIRCULATION_INDEXER_BATCH_SIZE']
+        count = 0
+        with establish_connection() as conn:
+            consumer = Consumer(
+                connection=conn,
+                queue=self.mq_queue.name,
+                exchange=self.mq_queue.exchange.name,
+                routing_key=self.mq_queue.routing_key,
+            )
+            while True:
+                messages = list(islice(consumer.iterqueue(), batch_size))
+                if not messages:
+                    break
+                ids = OrderedDict(
+                    (message.decode()['id'], None) for message in messages
+                )
+                if self.state_index:
+                    self.index_states_by_id(list(ids))
+                else:
+                    self.record_indexer.bulk_index(list(ids))
+                for message in messages:
+                    message.ack()
+                count += len(ids)
+            consumer.close()
+        return count
+
+    @property
+    def state_index(self):
+        """Name of the index of the circulation state documents."""
+        return current_app.config['CIRCULATION_ITEM_STATE_INDEX']
+
+    @staticmethod
+    def state_document(item):
+        """Get the circulation state document of an item."""
+        circulation = item.get('_circulation', {})
+        return {
+            'control_number': item.get('control_number'),
+            'location': item.get('location'),
+            '_circulation': {
+                'status': circulation.get('status'),
+                'holdings': circulation.get('holdings', []),
+            },
+        }
+
+    def index_states(self, items):
+        """Index the circulation state documents of items in bulk.
+
+        Documents of older revisions than the indexed ones are skipped.
+        """
+        doc_type = current_app.config['CIRCULATION_ITEM_STATE_DOC_TYPE']
+        success, errors = bulk(self.client, (
+            {
+                '_op_type': 'index',
+                '_index': self.state_index,
+                '_type': doc_type,
+                '_id': str(item.id),
+                '_version': item.revision_id,
+                '_version_type': 'external_gte',
+                '_source': self.state_document(item),
+            } for item in items
+        ), stats_only=True, raise_on_error=False)
+        if errors:
+            current_app.logger.error(
+                'Could not index the circulation state of %d items.', errors)
+        return success, errors
+
+    def index_states_by_id(self, ids):
+        """Index the circulation states of items, removing deleted ones."""
+        items = Record.get_records(ids)
+        deleted = set(ids) - set(str(item.id) for item in items)
+        self.index_states(items)
+        if deleted:
+            self.delete_states(deleted)
+
+    def delete_states(self, ids):
+        """Delete the circulation state documents of items in bulk."""
+        doc_type = current_app.config['CIRCULATION_ITEM_STATE_DOC_TYPE']
+        _, errors = bulk(self.client, (
+            {
+                '_op_type': 'delete',
+                '_index': self.state_index,
+                '_type': doc_type,
+                '_id': str(id_),
+            } for id_ in ids
+        ), stats_only=True, raise_on_error=False)
+        if errors:
+            current_app.logger.error(
+                'Could not delete the circulation state of %d items.', errors)
+
+    def index_records(self, items):
+        """Index whole items with a single bulk request.
+
+        Documents of older revisions than the indexed ones are skipped.
+        """
+        success, errors = bulk(self.client, (
+            self._index_action(item) for item in items
+        ), stats_only=True, raise_on_error=False)
+        if errors:
+            current_app.logger.error('Could not index %d items.', errors)
+        return success, errors
+
+    def reindex(self, ids):
+        """Bulk index whole items and their circulation state.
+
+        :param ids: UUIDs of the items.
+        :returns: Tuple of the number of indexed documents and of errors.
+        """
+        items = Record.get_records(ids)
+        success, errors = self.index_records(items)
+        if self.state_index:
+            state_success, state_errors = self.index_states(items)
+            success += state_success
+            errors += state_errors
+        return success, errors
+
+    def _index_action(self, item):
+        """Get the bulk action indexing a whole item."""
+        index, doc_type = self.record_indexer.record_to_index(item)
+        return {
+            '_op_type': 'index',
+            '_index': index,
+            '_type': doc_type,
+            '_id': str(item.id),
+            '_version': item.revision_id,
+            '_version_type': 'external_gte',
+            '_source': self.record_indexer._prepare_record(
+                item, index, doc_type),
+        }
+
+
+def item_id_chunks(since=None, chunk_size=1000):
+    """Stream the UUIDs of all registered items in chunks.
+
+    The items are paginated by their UUID, so that every chunk is read
+    with an index range scan from where the previous one stopped.
+
+    :param since: Only yield items updated since this UTC datetime.
+    :param chunk_size: Maximum number of UUIDs per chunk.
+    :returns: Iterator of lists of UUIDs.
+    """
+    query = db.session.query(RecordMetadata.id).join(
+        PersistentIdentifier,
+        PersistentIdentifier.object_uuid == RecordMetadata.id,
+    ).filter(
+        PersistentIdentifier.pid_type == 'crcitm',
+        PersistentIdentifier.object_type == 'rec',
+        PersistentIdentifier.status == PIDStatus.REGISTERED,
+        RecordMetadata.json != None,  # noqa
+    )
+    if since is not None:
+        query = query.filter(RecordMetadata.updated >= since)
+    query = query.order_by(RecordMetadata.id)
+
+    last = None
+    while True:
+        chunk_query = query
+        if last is not None:
+            chunk_query = query.filter(RecordMetadata.id > last)
+        ids = [id_ for id_, in chunk_query.limit(chunk_size)]
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def strip_circulation_state(sender, json=None, **kwargs):
+    """Leave the circulation state out of indexed items.
+
+    With `CIRCULATION_ITEM_STATE_INDEX` only the state index is updated on
+    circulation events, so the state in the index of the whole items would
+    be stale. Searches get it from the state index instead.
+    """
+    if current_app.config['CIRCULATION_ITEM_STATE_INDEX']:
+        json.pop('_circulation', None)
+
+
+def index_item_state(sender, *args, **kwargs):
+    """Index the circulation state of a created item."""
+    if '_circulation' in sender and \
+            current_app.config['CIRCULATION_ITEM_STATE_INDEX']:
+        CirculationIndexer().index([sender])
+
+
+def delete_item_state(sender, *args, **kwargs):
+    """Remove the circulation state of a deleted item.
+
+    Deferred items are queued, as the queue removes the states of the items
+    which are gone.
+    """
+    if '_circulation' not in sender or \
+            not current_app.config['CIRCULATION_ITEM_STATE_INDEX']:
+        return
+    indexer = CirculationIndexer()
+    if current_app.config['CIRCULATION_INDEXER_DEFERRED']:
+        indexer.index([sender])
+    else:
+        indexer.delete_states([sender.id])
+
+
+def after_commit(session):
+    """Publish the items changed in a committed transaction."""
+    if session.transaction is not None and session.transaction.nested:
+        return
+    pending = session.info.pop(CirculationIndexer.session_key, None)
+    if pending:
+        CirculationIndexer().publish(pending)
+
+
+def after_transaction_end(session, transaction):
+    """Forget the items changed in a rolled back transaction."""
+    if transaction.parent is None:
+        session.info.pop(CirculationIndexer.session_key, None)
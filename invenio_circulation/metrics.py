@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Latency and SQL statement metrics of circulation events."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from timeit import default_timer
+
+_current = threading.local()
+
+
+class EventMetrics(object):
+    """Phase durations and SQL statement count of a single event."""
+
+    def __init__(self):
+        """Initialize the metrics."""
+        self.phases = defaultdict(float)
+        self.statements = 0
+
+
+@contextmanager
+def phase(name):
+    """Measure the duration of a phase of the current event, if any."""
+    metrics = getattr(_current, 'event', None)
+    if metrics is None:
+        yield
+        return
+
+    start = default_timer()
+    try:
+        yield
+    finally:
+        metrics.phases[name] += default_timer() - start
+
+
+def count_statement(conn, cursor, statement, parameters, context,
+                    executemany):
+    """Count a SQL statement executed for the current event, if any."""
+    metrics = getattr(_current, 'event', None)
+    if metrics is not None:
+        metrics.statements += 1
+
+
+def outcome(code):
+    """Get the outcome label of an event response code."""
+    if code in (200, 202):
+        return 'success'
+    return str(code)
+
+
+class MetricsRegistry(object):
+    """Thread-safe aggregation of the metrics of circulation events.
+
+    The metrics are kept per process and rendered in the Prometheus text
+    exposition format.
+    """
+
+    def __init__(self):
+        """Initialize the registry."""
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Reset all metrics."""
+        with self._lock:
+            # (receiver, outcome) -> [count, seconds, statements]
+            self._events = defaultdict(lambda: [0, 0.0, 0])
+            # (receiver, outcome, phase) -> [count, seconds]
+            self._phases = defaultdict(lambda: [0, 0.0])
+
+    @contextmanager
+    def measure(self, event):
+        """Measure the processing of a webhook event.
+
+        The outcome is taken from the response code of the event, or is
+        ``500`` if processing raised an exception.
+        """
+        metrics = _current.event = EventMetrics()
+        code = 500
+        start = default_timer()
+        try:
+            yield metrics
+            code = event.response_code
+        finally:
+            duration = default_timer() - start
+            _current.event = None
+            self.add(event.receiver_id, outcome(code), duration, metrics)
+
+    def add(self, receiver_id, outcome, duration, metrics):
+        """Add the metrics of a processed event."""
+        with self._lock:
+            totals = self._events[(receiver_id, outcome)]
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] += metrics.statements
+            for name, seconds in metrics.phases.items():
+                totals = self._phases[(receiver_id, outcome, name)]
+                totals[0] += 1
+                totals[1] += seconds
+
+    def render(self):
+        """Render the metrics in the Prometheus text format."""
+        with self._lock:
+            events = sorted(self._events.items())
+            phases = sorted(self._phases.items())
+
+        lines = [
+            '# HELP circulation_event_duration_seconds '
+            'Duration of circulation events.',
+            '# TYPE circulation_event_duration_seconds summary',
+        ]
+        for (receiver_id, outcome), (count, seconds, _) in events:
+            labels = _labels(receiver=receiver_id, outcome=outcome)
+            lines.append('circulation_event_duration_seconds_count{0} {1}'
+                         .format(labels, count))
+            lines.append('circulation_event_duration_seconds_sum{0} {1!r}'
+                         .format(labels, seconds))
+
+        lines.extend([
+            '# HELP circulation_event_phase_duration_seconds '
+            'Duration of the phases of circulation events.',
+            '# TYPE circulation_event_phase_duration_seconds summary',
+        ])
+        for (receiver_id, outcome, name), (count, seconds) in phases:
+            labels = _labels(receiver=receiver_id, outcome=outcome,
+                             phase=name)
+            lines.append(
+                'circulation_event_phase_duration_seconds_count{0} {1}'
+                .format(labels, count))
+            lines.append(
+                'circulation_event_phase_duration_seconds_sum{0} {1!r}'
+                .format(labels, seconds))
+
+        lines.extend([
+            '# HELP circulation_event_sql_statements '
+            'SQL statements executed for circulation events.',
+            '# TYPE circulation_event_sql_statements summary',
+        ])
+        for (receiver_id, outcome), (count, _, statements) in events:
+            labels = _labels(receiver=receiver_id, outcome=outcome)
+            lines.append('circulation_event_sql_statements_count{0} {1}'
+                         .format(labels, count))
+            lines.append('circulation_event_sql_statements_sum{0} {1}'
+                         .format(labels, statements))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**kwargs):
+    """Format Prometheus labels."""
+    return '{' + ','.join(
+        '{0}="{1}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in sorted(kwargs.items())
+    ) + '}'
+
+
+metrics = MetricsRegistry()
+"""Metrics of the circulation events handled by this process."""
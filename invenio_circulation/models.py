@@ -26,8 +26,17 @@
 
 from __future__ import absolute_import, print_function
 
+import datetime
+import uuid
+
+from flask import current_app
 from invenio_db import db
 from invenio_pidstore.models import RecordIdentifier
+from invenio_records.models import RecordMetadata
+from sqlalchemy.dialects import postgresql
+from sqlalchemy_utils.types import JSONType, UUIDType
+
+from .proxies import current_circulation_policy
 
 
 class CirculationItemIdentifier(RecordIdentifier):
@@ -47,4 +56,191 @@ class ItemStatus(object):
 
     ON_SHELF = 'on_shelf'
     ON_LOAN = 'on_loan'
+    OVERDUE = 'overdue'
     MISSING = 'missing'
+
+
+class HoldingKind(object):
+    """Class holding all available kinds of holdings."""
+
+    LOAN = 'loan'
+    REQUEST = 'request'
+
+
+def parse_date(value):
+    """Parse a holding date string using `CIRCULATION_DATE_FORMAT`."""
+    return current_circulation_policy.parse_date(value)
+
+
+class CirculationHolding(db.Model):
+    """Normalized copy of the holdings stored in `_circulation.holdings`.
+
+    Each row mirrors one holding of an item, so that lookups per user or per
+    date can use regular indexes instead of unpacking the JSON array.
+    The rows are maintained by the circulation actions of
+    :class:`invenio_circulation.api.Item`.
+    """
+
+    __tablename__ = 'circulation_holding'
+    __table_args__ = (
+        db.Index('idx_circulation_holding_item_id_start_date',
+                 'item_id', 'start_date'),
+        db.Index('idx_circulation_holding_kind_end_date',
+                 'kind', 'end_date', 'holding_id'),
+    )
+
+    holding_id = db.Column(UUIDType, primary_key=True)
+    """Holding identifier, as used in `_circulation.holdings`."""
+
+    item_id = db.Column(
+        UUIDType,
+        db.ForeignKey(RecordMetadata.id, ondelete='CASCADE'),
+        nullable=False,
+    )
+    """Identifier of the item record."""
+
+    user_id = db.Column(db.Integer, index=True, nullable=True)
+    """Identifier of the user holding the item."""
+
+    start_date = db.Column(db.Date, nullable=True)
+    end_date = db.Column(db.Date, nullable=True)
+    delivery = db.Column(db.String(255), nullable=True)
+
+    kind = db.Column(db.String(255), nullable=False)
+    """Either a HoldingKind.LOAN or a HoldingKind.REQUEST."""
+
+    item = db.relationship(RecordMetadata)
+
+    @classmethod
+    def create(cls, item_id, holding, kind):
+        """Store the row of a new holding."""
+        with db.session.begin_nested():
+            obj = cls(
+                holding_id=uuid.UUID(str(holding['id'])),
+                item_id=item_id,
+                user_id=holding.get('user_id'),
+                start_date=parse_date(holding.get('start_date')),
+                end_date=parse_date(holding.get('end_date')),
+                delivery=holding.get('delivery'),
+                kind=kind,
+            )
+            db.session.add(obj)
+        return obj
+
+    @classmethod
+    def update(cls, holding_id, **kwargs):
+        """Update the row of a holding."""
+        for key in ('start_date', 'end_date'):
+            if key in kwargs:
+                kwargs[key] = parse_date(kwargs[key])
+        cls.query.filter_by(
+            holding_id=uuid.UUID(str(holding_id))
+        ).update(kwargs, synchronize_session='fetch')
+
+    @classmethod
+    def remove(cls, holding_id):
+        """Delete the row of a holding."""
+        cls.query.filter_by(
+            holding_id=uuid.UUID(str(holding_id))
+        ).delete(synchronize_session='fetch')
+
+    @classmethod
+    def sync(cls, item):
+        """Replace all rows of an item with its current holdings.
+
+        Meant for backfilling items whose holdings predate this table.
+        """
+        with db.session.begin_nested():
+            cls.query.filter_by(item_id=item.id).delete(
+                synchronize_session='fetch')
+            on_loan = item['_circulation']['status'] in (
+                ItemStatus.ON_LOAN, ItemStatus.OVERDUE)
+            for index, holding in enumerate(item.holdings):
+                kind = HoldingKind.LOAN if on_loan and index == 0 \
+                    else HoldingKind.REQUEST
+                cls.create(item.id, holding, kind)
+
+
+class CirculationIdempotencyKey(db.Model):
+    """Response of a circulation event stored by its idempotency key.
+
+    A key is unique per user and receiver. Its response is only replayed
+    within `CIRCULATION_IDEMPOTENCY_TTL` of its creation.
+    """
+
+    __tablename__ = 'circulation_idempotency_key'
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    receiver_id = db.Column(db.String(255), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+
+    event_id = db.Column(UUIDType, nullable=False)
+    """Identifier of the webhook event which used the key first."""
+
+    created = db.Column(db.DateTime, nullable=False, index=True,
+                        default=datetime.datetime.utcnow)
+
+    response_code = db.Column(db.Integer, nullable=True)
+    """Response code of the event, None while it is being processed."""
+
+    response = db.Column(
+        JSONType().with_variant(
+            postgresql.JSON(none_as_null=True),
+            'postgresql',
+        ),
+        nullable=True,
+    )
+
+    @classmethod
+    def expiry(cls):
+        """Get the creation time before which keys are expired."""
+        return datetime.datetime.utcnow() - \
+            current_app.config['CIRCULATION_IDEMPOTENCY_TTL']
+
+    @property
+    def is_expired(self):
+        """Check if the key is older than its time to live."""
+        return self.created < self.expiry()
+
+    @classmethod
+    def purge(cls):
+        """Delete all expired keys."""
+        return cls.query.filter(cls.created < cls.expiry()).delete(
+            synchronize_session=False)
+
+
+class CirculationCheckpoint(db.Model):
+    """Position up to which a circulation batch job has done its work.
+
+    The position is stored in the transaction of each batch, so that an
+    interrupted job resumes after the last committed batch.
+    """
+
+    __tablename__ = 'circulation_checkpoint'
+
+    name = db.Column(db.String(255), primary_key=True)
+    """Name of the batch job."""
+
+    position = db.Column(
+        JSONType().with_variant(
+            postgresql.JSON(none_as_null=True),
+            'postgresql',
+        ),
+        nullable=True,
+    )
+    """Job specific position, None to start from the beginning."""
+
+    updated = db.Column(db.DateTime, nullable=False,
+                        default=datetime.datetime.utcnow,
+                        onupdate=datetime.datetime.utcnow)
+
+    @classmethod
+    def get(cls, name):
+        """Get the position of a job."""
+        obj = cls.query.get(name)
+        return obj.position if obj is not None else None
+
+    @classmethod
+    def set(cls, name, position):
+        """Store the position of a job."""
+        db.session.merge(cls(name=name, position=position))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Circulation policy of an application."""
+
+from __future__ import absolute_import, print_function
+
+import datetime
+from collections import namedtuple
+
+from .utils import LRUCache
+
+_dates = LRUCache(maxsize=4096)
+"""Parsed dates by format and date string."""
+
+
+class CirculationPolicy(namedtuple('CirculationPolicy',
+                                   ['loan_period', 'date_format', 'today'])):
+    """Immutable circulation settings resolved once per application.
+
+    :param loan_period: Maximum loan duration as a :class:`datetime.timedelta`.
+    :param date_format: Format of the holding date strings.
+    :param today: Callable returning the current date.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, config, today=None):
+        """Create the policy from an application configuration."""
+        return cls(
+            loan_period=datetime.timedelta(
+                days=config['CIRCULATION_LOAN_PERIOD']),
+            date_format=config['CIRCULATION_DATE_FORMAT'],
+            today=today or datetime.date.today,
+        )
+
+    def parse_date(self, value):
+        """Parse a holding date string, passing dates and None through.
+
+        Holdings share few distinct dates, so the parsed dates are cached.
+        """
+        if value is None or isinstance(value, datetime.date):
+            return value
+        key = (self.date_format, value)
+        date = _dates.get(key)
+        if date is None:
+            date = datetime.datetime.strptime(value, self.date_format).date()
+            _dates.set(key, date)
+        return date
+
+    def loan_end_date(self, start_date=None):
+        """Get the latest end date of a loan starting at the given date."""
+        return (start_date or self.today()) + self.loan_period
@@ -33,3 +33,8 @@ current_circulation = LocalProxy(
     lambda: current_app.extensions['invenio-circulation']
 )
 """Helper proxy to access state object."""
+
+current_circulation_policy = LocalProxy(
+    lambda: current_app.extensions['invenio-circulation-policy']
+)
+"""Helper proxy to access the circulation policy of the application."""
@@ -25,114 +25,433 @@
 
 """Circulation webhooks."""
 
-from invenio_db import db
-from invenio_indexer.api import RecordIndexer
-from invenio_pidstore.resolver import Resolver
-from invenio_webhooks.models import Receiver
+import time
+import uuid
+import zlib
 
-from .api import Item
-from .validators import BaseSchema, CancelItemSchema, ExtendItemSchema, \
-    LoanItemSchema, RequestItemSchema, ReturnItemSchema, \
-    ReturnMissingItemSchema
+import six
+from flask import current_app, has_request_context, request, url_for
+from invenio_db import db
+from invenio_pidstore.errors import PIDDoesNotExistError, ResolverError
+from invenio_webhooks.models import Event, Receiver
+from marshmallow import ValidationError, fields
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+
+from .api import CIRCULATION_ACTIONS, Item
+from .metrics import metrics, phase
+from .models import CirculationIdempotencyKey
+from .tasks import process_event
+
+
+def _is_conflict(error):
+    """Check if an error can be retried from the savepoint of the event.
+
+    Only deadlocks and stale versions qualify: rolling back to the savepoint
+    releases the row locks taken since, and under READ COMMITTED the items
+    are read again with the latest committed data. A serialization failure
+    (40001) aborts the whole transaction instead, so it is not retried here.
+    """
+    if isinstance(error, StaleDataError):
+        return True
+    # deadlock_detected
+    return getattr(error.orig, 'pgcode', None) == '40P01'
+
+
+def _is_dry_run(payload):
+    """Check if the payload of an event asks for a dry run.
+
+    The flag is parsed as the `dry_run` field of the event schemas, so that
+    e.g. ``"false"`` is not taken for a dry run. Invalid values are left to
+    the validation of the event.
+    """
+    try:
+        return fields.Boolean().deserialize(payload.get('dry_run'))
+    except ValidationError:
+        return False
+
+
+def _idempotency_key(event):
+    """Get the idempotency key of an event, if any."""
+    key = None
+    if has_request_context():
+        key = request.headers.get('Idempotency-Key')
+    key = key or (event.payload or {}).get('idempotency_key')
+    return six.text_type(key) if key else None
+
+
+def event_queue(item_id):
+    """Get the Celery queue of the events of an item.
+
+    Events of the same item always go to the same queue, so they are
+    processed in order by a worker consuming that queue alone.
+    """
+    partitions = current_app.config['CIRCULATION_RECEIVER_PARTITIONS']
+    key = zlib.crc32(str(item_id).encode('utf-8')) & 0xffffffff
+    return '{0}.{1}'.format(current_app.config['CIRCULATION_RECEIVER_QUEUE'],
+                            key % partitions)
 
 
 class ReceiverBase(Receiver):
     """Reciever base class to handle incoming circulation requests."""
 
-    circulation_event_schema = BaseSchema()
+    action = None
+    """Name of the circulation action, see
+    :data:`invenio_circulation.api.CIRCULATION_ACTIONS`."""
+
+    @property
+    def circulation_event_schema_class(self):
+        """Schema of the arguments of the circulation action."""
+        return CIRCULATION_ACTIONS[self.action][0]
+
+    def __call__(self, event):
+        """Handle the event unless it repeats an earlier request.
+
+        An event with an ``Idempotency-Key`` header or an `idempotency_key`
+        field gets the stored response of the first event of the user with
+        the same key, without being processed again.
+        """
+        key = _idempotency_key(event)
+        if key is None or event.user_id is None:
+            return self._dispatch(event)
+
+        if len(key) > 255:
+            event.response_code = 400
+            event.response = {'status': 400, 'message': {
+                'idempotency_key': ['Longer than maximum length 255.']}}
+            return
+
+        pk = (event.user_id, self.receiver_id, key)
+        stored = CirculationIdempotencyKey.query.get(pk)
+        if stored is not None and stored.is_expired:
+            with db.session.begin_nested():
+                db.session.delete(stored)
+            stored = None
+
+        if stored is None:
+            try:
+                with db.session.begin_nested():
+                    stored = CirculationIdempotencyKey(
+                        user_id=event.user_id,
+                        receiver_id=self.receiver_id,
+                        key=key,
+                        event_id=event.id,
+                    )
+                    db.session.add(stored)
+            except IntegrityError:
+                # A concurrent event with the same key was committed first
+                stored = CirculationIdempotencyKey.query.get(pk)
+                if stored is None:
+                    return self._dispatch(event)
+            else:
+                try:
+                    self._dispatch(event)
+                except Exception:
+                    with db.session.begin_nested():
+                        db.session.delete(stored)
+                    raise
+                stored.response_code = event.response_code
+                stored.response = event.response
+                return
+
+        if stored.response_code is None:
+            event.response_code = 409
+            event.response = {
+                'status': 409,
+                'message': 'An event with the same idempotency key is '
+                           'being processed.',
+            }
+        else:
+            event.response_code = stored.response_code
+            event.response = stored.response
+
+    def _dispatch(self, event):
+        """Process the event or dispatch it to a Celery worker.
+
+        With `CIRCULATION_RECEIVER_ASYNC` only the presence of the item is
+        checked before the event is accepted. Its status can be polled from
+        the `status` link of the response. Dry runs are answered right away.
+
+        The items of a basket are split by partition, so that the events of
+        every item stay in order. If they span several partitions, an event
+        is created for each of them and listed in the `events` of the
+        response with its items and `status` link.
+        """
+        if not current_app.config['CIRCULATION_RECEIVER_ASYNC']:
+            return self.run(event)
+
+        payload = event.payload or {}
+        if _is_dry_run(payload) and self._dry_run(event):
+            return
+
+        if 'item_ids' in payload:
+            item_ids = payload['item_ids']
+            if not isinstance(item_ids, list) or not item_ids:
+                event.response_code = 400
+                event.response = {
+                    'message': {'item_ids': ['Not a valid list.']}}
+                return
+            partitions = {}
+            for item_id in item_ids:
+                partitions.setdefault(event_queue(item_id), []).append(
+                    item_id)
+        else:
+            item_id = payload.get('item_id')
+            if not item_id:
+                event.response_code = 400
+                event.response = {'message': {'item_id': ['Missing data.']}}
+                return
+            partitions = {event_queue(item_id): None}
+
+        if len(partitions) == 1:
+            [queue] = partitions
+            event.response_code = 202
+            event.response = {
+                'status': 202,
+                'message': 'Accepted.',
+                'links': {'status': self._status_url(event)},
+            }
+            events = [(event, queue)]
+        else:
+            events = [
+                (Event(id=uuid.uuid4(), receiver_id=event.receiver_id,
+                       user_id=event.user_id,
+                       payload=dict(payload, item_ids=item_ids)), queue)
+                for queue, item_ids in sorted(partitions.items())
+            ]
+            event.response_code = 202
+            event.response = {
+                'status': 202,
+                'message': 'Accepted.',
+                'events': [{
+                    'item_ids': child.payload['item_ids'],
+                    'links': {'status': self._status_url(child)},
+                } for child, _ in events],
+            }
+
+        # The worker must not see the event before it has been accepted.
+        db.session.add(event)
+        for child, _ in events:
+            db.session.add(child)
+        db.session.commit()
+        for child, queue in events:
+            process_event.apply_async(args=[str(child.id)], queue=queue)
+
+    @staticmethod
+    def _status_url(event):
+        """Get the URL of the status of an event."""
+        return url_for('circulation_rest.event_status',
+                       event_id=str(event.id), _external=True)
 
     def run(self, event):
         """Process the circulation event.
 
-        This method builds the frame, fetching the item and calling *_run*
-        in a nested transaction.
+        With `CIRCULATION_METRICS_ENABLED` the duration of the event, its
+        phases and its SQL statements are recorded.
         """
-        resolver = Resolver(pid_type='crcitm', object_type='rec',
-                            getter=Item.get_record)
-        _, item = resolver.resolve(event.payload['item_id'])
+        if not current_app.config['CIRCULATION_METRICS_ENABLED']:
+            return self._handle(event)
+        with metrics.measure(event):
+            return self._handle(event)
 
-        self.circulation_event_schema.context['item'] = item
+    def _handle(self, event):
+        """Process the circulation event.
 
-        data, errors = self.circulation_event_schema.load(event.payload)
-        if errors:
-            event.response_code = 400
-            event.response = {'message': errors}
+        The event is processed in a savepoint while holding a lock on the
+        item. If it is chosen as the victim of a deadlock or finds a stale
+        item version, the savepoint is rolled back and the event is retried
+        up to `CIRCULATION_RECEIVER_RETRIES` times with exponential backoff.
+        """
+        if _is_dry_run(event.payload or {}) and self._dry_run(event):
             return
 
-        if data.get('dry_run'):
+        retries = current_app.config['CIRCULATION_RECEIVER_RETRIES']
+        backoff = current_app.config['CIRCULATION_RECEIVER_RETRY_BACKOFF']
+
+        attempt = 0
+        while True:
+            try:
+                with db.session.begin_nested():
+                    return self._process(event)
+            except (OperationalError, StaleDataError) as e:
+                if attempt >= retries or not _is_conflict(e):
+                    raise
+            time.sleep(backoff * 2 ** attempt)
+            attempt += 1
+
+    def _dry_run(self, event):
+        """Validate the event against the circulation state of its items.
+
+        Only the `_circulation` subtrees of the items are read, without
+        locking or opening a savepoint, see
+        :meth:`invenio_circulation.api.Item.get_circulation_states`.
+
+        :returns: False if the only item of the event does not resolve, so
+            that processing the event reports the error.
+        """
+        payload = dict(event.payload)
+        item_ids = payload.pop('item_ids', None)
+        if item_ids is None:
+            item_id = six.text_type(payload['item_id'])
+            with phase('resolve'):
+                item = Item.get_circulation_states([item_id]).get(item_id)
+            if item is None:
+                return False
+            code, response = self._validate_item(item, payload)
+            event.response_code = code
+            if response is not None:
+                event.response = response
+            return True
+
+        if not isinstance(item_ids, list):
+            return False
+        item_ids = [six.text_type(item_id) for item_id in item_ids]
+        with phase('resolve'):
+            items = Item.get_circulation_states(item_ids)
+
+        results = []
+        for item_id in item_ids:
+            if item_id in items:
+                code, response = self._validate_item(items[item_id], payload)
+            else:
+                code, response = 404, {'status': 404,
+                                       'message': 'The item does not exist.'}
+            results.append(dict(response or {'status': code},
+                                item_id=item_id))
+        self._set_items_response(event, results)
+        return True
+
+    def _validate_item(self, item, payload):
+        """Validate a dry run of the event for an item.
+
+        :returns: A tuple of the status code and the response, if any.
+        """
+        schema = self.circulation_event_schema_class(context={'item': item})
+        with phase('validate'):
+            _, errors = schema.load(payload)
+        if errors:
+            return 400, {'status': 400, 'message': errors}
+        return 204, None
+
+    def _process(self, event):
+        """Process the circulation event.
+
+        The action is applied with :meth:`invenio_circulation.api.Item.
+        bulk_apply` to the locked item. A payload with `item_ids` instead of
+        `item_id` applies it to each of the items, see
+        :meth:`_process_items`.
+        """
+        if 'item_ids' in event.payload:
+            return self._process_items(event)
+
+        with phase('resolve'):
+            item = Item.get_record_by_pid(event.payload['item_id'],
+                                          for_update=True)
+        [(_, error)] = Item.bulk_apply(self.action, [(item, event.payload)])
+        if error is not None:
+            event.response_code = error['status']
+            event.response = error
+        elif _is_dry_run(event.payload):
             event.response_code = 204
+
+    def _process_items(self, event):
+        """Process a circulation event for several items.
+
+        The items are locked in the order of their identifiers to avoid
+        deadlocks between concurrent events, and the action is applied to
+        all of them with :meth:`invenio_circulation.api.Item.bulk_apply`.
+        The response contains the status of every item, see
+        :meth:`_set_items_response`.
+        """
+        payload = dict(event.payload)
+        item_ids = payload.pop('item_ids')
+        if not isinstance(item_ids, list):
+            event.response_code = 400
+            event.response = {'message': {'item_ids': ['Not a valid list.']}}
             return
 
-        with db.session.begin_nested():
-            data, _ = self.circulation_event_schema.dump(data)
-            self._run(item, data)
-            item.commit()
-            RecordIndexer().index(item)
+        item_ids = [six.text_type(item_id) for item_id in item_ids]
+        results = {}
+        arguments = []
+        for item_id in sorted(set(item_ids)):
+            try:
+                with phase('resolve'):
+                    item = Item.get_record_by_pid(item_id, for_update=True)
+            except (PIDDoesNotExistError, ResolverError):
+                results[item_id] = {'item_id': item_id, 'status': 404,
+                                    'message': 'The item does not exist.'}
+                continue
+            arguments.append((item_id, item))
+
+        applied = Item.bulk_apply(
+            self.action, [(item, payload) for _, item in arguments])
+        code = 204 if _is_dry_run(payload) else 202
+        for (item_id, _), (_, error) in zip(arguments, applied):
+            results[item_id] = dict(error or {'status': code},
+                                    item_id=item_id)
+
+        self._set_items_response(
+            event, [results[item_id] for item_id in item_ids]
+        )
+
+    @staticmethod
+    def _set_items_response(event, results):
+        """Set the response of an event with the results of its items.
+
+        The event succeeds with 202 if all of the items did, or with 204 if
+        it is a dry run, and fails with 400 if none did. Otherwise it gets a
+        207 multi-status, as the successful items are changed.
+        """
+        failed = [r for r in results if r['status'] not in (202, 204)]
+        if not failed:
+            code = 202
+            if results and all(r['status'] == 204 for r in results):
+                code = 204
+        elif len(failed) == len(results):
+            code = 400
+        else:
+            code = 207
+        event.response_code = code
+        event.response = {'status': code, 'items': results}
 
 
 class LoanReceiver(ReceiverBase):
     """Handle incomming loan requests."""
 
-    circulation_event_schema = LoanItemSchema()
-
-    def _run(self, item, payload):
-        """Process a loan event."""
-        item.loan_item(**payload)
+    action = 'loan_item'
 
 
 class RequestReceiver(ReceiverBase):
     """Handle incomming requests."""
 
-    circulation_event_schema = RequestItemSchema()
-
-    def _run(self, item, payload):
-        """Process a request event."""
-        item.request_item(**payload)
+    action = 'request_item'
 
 
 class ReturnReceiver(ReceiverBase):
     """Handle incomming return requests."""
 
-    circulation_event_schema = ReturnItemSchema()
-
-    def _run(self, item, _):
-        """Process a return event."""
-        item.return_item()
+    action = 'return_item'
 
 
 class LoseReceiver(ReceiverBase):
     """Handle incomming return requests."""
 
-    def _run(self, item, _):
-        """Process a lose event."""
-        item.lose_item()
+    action = 'lose_item'
 
 
 class ReturnMissingReceiver(ReceiverBase):
     """Handle incomming return_missing requests."""
 
-    circulation_event_schema = ReturnMissingItemSchema()
-
-    def _run(self, item, _):
-        """Process a return_missing event."""
-        item.return_missing_item()
+    action = 'return_missing_item'
 
 
 class CancelReceiver(ReceiverBase):
     """Handle incomming cancel requests."""
 
-    circulation_event_schema = CancelItemSchema()
-
-    def _run(self, item, payload):
-        """Process a cancel event."""
-        item.cancel_hold(payload['hold_id'])
+    action = 'cancel_hold'
 
 
 class ExtendReceiver(ReceiverBase):
     """Handle incomming extension requests."""
 
-    circulation_event_schema = ExtendItemSchema()
-
-    def _run(self, item, payload):
-        """Process an extend event."""
-        item.extend_loan(payload['requested_end_date'])
+    action = 'extend_loan'
@@ -24,7 +24,16 @@
 
 """Configuration for circulation search."""
 
+from elasticsearch_dsl.query import Q
+from flask import abort, current_app, request
+from invenio_records_rest.query import es_search_factory
 from invenio_search import RecordsSearch
+from werkzeug.datastructures import MultiDict
+
+from .utils import authenticated_user_id
+
+USER_HOLDINGS_SIZE = 100
+"""Maximum number of holdings of a user returned per item."""
 
 
 class ItemSearch(RecordsSearch):
@@ -35,3 +44,55 @@ class ItemSearch(RecordsSearch):
 
         index = 'circulation-item'
         doc_types = None
+
+
+class ItemStateSearch(RecordsSearch):
+    """Search class for the circulation state of the items.
+
+    The index defaults to `CIRCULATION_ITEM_STATE_INDEX`.
+    """
+
+    class Meta:
+        """Configuration for circulation state search."""
+
+        index = None
+        doc_types = None
+
+    def __init__(self, **kwargs):
+        """Search the configured index of the circulation states."""
+        kwargs.setdefault(
+            'index', current_app.config['CIRCULATION_ITEM_STATE_INDEX'])
+        super(ItemStateSearch, self).__init__(**kwargs)
+
+
+def user_holdings_search_factory(self, search):
+    """Search the items held by the user given as ``user_id`` argument.
+
+    The holdings are filtered with a nested query, so that only the holdings
+    of the user are returned as inner hits instead of all the holdings of
+    the items. Users can only search their own holdings. Without
+    ``user_id`` the query string is parsed as usual.
+
+    :param self: REST view.
+    :param search: Elastic search DSL search instance.
+    :returns: Tuple with search instance and URL arguments.
+    """
+    user_id = request.values.get('user_id', type=int)
+    if user_id is None:
+        return es_search_factory(self, search)
+
+    current_user_id = authenticated_user_id()
+    if current_user_id is None:
+        abort(401)
+    if user_id != current_user_id:
+        abort(403)
+
+    search = search.query(Q(
+        'nested',
+        path='_circulation.holdings',
+        query=Q('bool', filter=[
+            Q('term', **{'_circulation.holdings.user_id': user_id}),
+        ]),
+        inner_hits={'name': 'holdings', 'size': USER_HOLDINGS_SIZE},
+    )).extra(_source={'exclude': ['_circulation.holdings']})
+    return search, MultiDict(dict(user_id=user_id))
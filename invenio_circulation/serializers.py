@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Circulation serializers."""
+
+from __future__ import absolute_import, print_function
+
+from flask import current_app
+from invenio_records_rest.serializers.json import JSONSerializer
+from invenio_records_rest.serializers.response import search_responsify
+from invenio_records_rest.serializers.schemas.json import RecordSchemaJSONV1
+from invenio_search import current_search_client
+
+
+class ItemJSONSerializer(JSONSerializer):
+    """JSON serializer adding the circulation state to the item hits.
+
+    With `CIRCULATION_ITEM_STATE_INDEX` the indexed items leave out their
+    circulation state, which is fetched from the state index for all hits
+    of a page with a single multi-get request.
+    """
+
+    def serialize_search(self, pid_fetcher, search_result, links=None,
+                         item_links_factory=None):
+        """Serialize a search result with the circulation state."""
+        index = current_app.config['CIRCULATION_ITEM_STATE_INDEX']
+        hits = search_result['hits']['hits']
+        if index and hits:
+            docs = current_search_client.mget(
+                index=index, body={'ids': [hit['_id'] for hit in hits]},
+                _source_include='_circulation',
+            )['docs']
+            for hit, doc in zip(hits, docs):
+                if doc.get('found'):
+                    hit['_source']['_circulation'] = \
+                        doc['_source']['_circulation']
+        return super(ItemJSONSerializer, self).serialize_search(
+            pid_fetcher, search_result, links=links,
+            item_links_factory=item_links_factory)
+
+
+class HoldingsJSONSerializer(JSONSerializer):
+    """JSON serializer replacing the holdings by the matched inner hits.
+
+    Hits without inner hits are serialized unchanged.
+    """
+
+    @staticmethod
+    def preprocess_search_hit(pid, record_hit, links_factory=None):
+        """Prepare a record hit with the matched holdings only."""
+        record = JSONSerializer.preprocess_search_hit(
+            pid, record_hit, links_factory=links_factory)
+        inner_hits = record_hit.get('inner_hits', {}).get('holdings')
+        if inner_hits is not None:
+            circulation = record['metadata'].setdefault('_circulation', {})
+            circulation['holdings'] = [
+                hit['_source'] for hit in inner_hits['hits']['hits']
+            ]
+        return record
+
+
+json_v1_item_search = search_responsify(
+    ItemJSONSerializer(RecordSchemaJSONV1), 'application/json')
+"""JSON search response builder with the circulation state of the items."""
+
+json_v1_holdings_search = search_responsify(
+    HoldingsJSONSerializer(RecordSchemaJSONV1), 'application/json')
+"""JSON search response builder with the matched holdings of the items."""
@@ -51,6 +51,7 @@
 
     function link(scope, element, attributes) {
       scope.items = circulationItemStore.items;
+      scope.results = {};
       scope.remove = function(index) {
         circulationItemStore.items.splice(index, 1);
       }
@@ -58,35 +59,42 @@
         var data = {
           'user_id': circulationUserStore.user.id,
         };
-        performAction(attributes.loanEndpoint, data);
+        performAction(attributes.loanEndpoint, data, scope);
       }
       scope.request = function() {
         var data = {
           'user_id': circulationUserStore.user.id,
         };
-        performAction(attributes.requestEndpoint, data);
+        performAction(attributes.requestEndpoint, data, scope);
       }
       scope.return = function() {
         var data = {};
-        performAction(attributes.returnEndpoint, data);
+        performAction(attributes.returnEndpoint, data, scope);
       }
     }
 
-    function performAction(actionEndpoint, data) {
-      angular.forEach(circulationItemStore.items, function(item, index) {
-        var send_data = angular.copy(data);
-        send_data.item_id = item.id;
-        angular.extend(send_data, circulationSettingsStore.getPayload());
+    function performAction(actionEndpoint, data, scope) {
+      var send_data = angular.copy(data);
+      send_data.item_ids = circulationItemStore.items.map(function(item) {
+        return item.id;
+      });
+      angular.extend(send_data, circulationSettingsStore.getPayload());
 
-        $http({
-          method: 'POST',
-          url: actionEndpoint,
-          headers: {
-            'Content-Type': 'application/json'
-          },
-          data: send_data,
+      $http({
+        method: 'POST',
+        url: actionEndpoint,
+        headers: {
+          'Content-Type': 'application/json'
+        },
+        data: send_data,
+      }).then(showResults, showResults);
+
+      function showResults(response) {
+        scope.results = {};
+        angular.forEach((response.data || {}).items, function(result) {
+          scope.results[result.item_id] = result;
         });
-      })
+      }
     }
 
     function templateUrl(element, attrs) {
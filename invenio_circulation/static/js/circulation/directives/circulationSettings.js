@@ -28,9 +28,19 @@
     .module('circulationSettings')
     .directive('circulationSettings', circulationSettings);
 
-  circulationSettings.$inject = ['circulationSettingsStore'];
+  circulationSettings.$inject = [
+    '$http',
+    '$q',
+    'circulationItemStore',
+    'circulationSettingsStore',
+  ];
 
-  function circulationSettings(circulationSettingsStore) {
+  function circulationSettings(
+      $http,
+      $q,
+      circulationItemStore,
+      circulationSettingsStore
+  ) {
     var directive = {
       link: link,
       scope: true,
@@ -41,6 +51,29 @@
 
     function link(scope, element, attributes) {
       scope.settings = circulationSettingsStore.settings;
+      scope.selectRange = circulationSettingsStore.selectRange;
+
+      scope.$watchCollection(function() {
+        return circulationItemStore.items;
+      }, function(items) {
+        var requests = [];
+        angular.forEach(items, function(item) {
+          requests.push($http({
+            method: 'GET',
+            url: attributes.availabilityEndpoint + item.id + '/availability',
+            headers: {
+              'Content-Type': 'application/json'
+            },
+          }));
+        });
+        $q.all(requests).then(function(responses) {
+          var rangesPerItem = [];
+          angular.forEach(responses, function(response) {
+            rangesPerItem.push(response.data.available);
+          });
+          circulationSettingsStore.setAvailability(rangesPerItem);
+        });
+      });
     }
 
     function templateUrl(element, attrs) {
@@ -42,19 +42,31 @@
     function link(scope, element, attributes) {
       scope.requestedEndDate = '',
 
-      $http({
-        method: 'GET',
-        url: attributes.searchEndpoint,
-        headers: {
-          'Content-Type': 'application/json'
-        },
-        params: {q: attributes.query + attributes.currentUserId},
-      }).then(function(response) {
-        circulationUserHoldingsStore.setHoldings(response.data.hits.hits,
-                                                 attributes.currentUserId);
-        scope.loans = circulationUserHoldingsStore.loans;
-        scope.requests = circulationUserHoldingsStore.requests;
-      });
+      scope.loans = circulationUserHoldingsStore.loans;
+      scope.requests = circulationUserHoldingsStore.requests;
+      scope.next = {};
+
+      scope.more = function(kind) {
+        fetchHoldings(kind, scope.next[kind]);
+      };
+
+      fetchHoldings('loan', attributes.holdingsEndpoint);
+      fetchHoldings('request', attributes.holdingsEndpoint);
+
+      function fetchHoldings(kind, url) {
+        $http({
+          method: 'GET',
+          url: url,
+          headers: {
+            'Content-Type': 'application/json'
+          },
+          params: url == attributes.holdingsEndpoint ? {kind: kind} : {},
+        }).then(function(response) {
+          circulationUserHoldingsStore.addHoldings(kind,
+                                                   response.data.hits.hits);
+          scope.next[kind] = response.data.links.next;
+        });
+      }
 
       scope.extend = function(itemId) {
         var data = {
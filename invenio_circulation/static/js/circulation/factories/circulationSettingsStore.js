@@ -35,15 +35,46 @@
       delivery: ['mail', 'pickup'],
       selectedDelivery: 'mail',
       waitlist: false,
+      availability: [],
     };
 
     var service = {
       settings: settings,
       getPayload: getPayload,
+      setAvailability: setAvailability,
+      selectRange: selectRange,
     };
 
     return service;
 
+    function setAvailability(rangesPerItem) {
+      // Keep only the date ranges in which every item is available
+      var common = null;
+      angular.forEach(rangesPerItem, function(ranges) {
+        if (common === null) {
+          common = ranges;
+          return;
+        }
+        var intersection = [];
+        angular.forEach(common, function(a) {
+          angular.forEach(ranges, function(b) {
+            var start = a.start_date > b.start_date ? a.start_date : b.start_date;
+            var end = a.end_date < b.end_date ? a.end_date : b.end_date;
+            if (start <= end) {
+              intersection.push({'start_date': start, 'end_date': end});
+            }
+          });
+        });
+        common = intersection;
+      });
+      settings.availability = common || [];
+    }
+
+    function selectRange(range) {
+      settings.startDate = range.start_date;
+      settings.endDate = range.end_date;
+    }
+
     function getPayload() {
       var data = {
         'start_date': settings.startDate,
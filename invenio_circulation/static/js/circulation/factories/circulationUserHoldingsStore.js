@@ -35,26 +35,17 @@
     var service = {
       loans: loans,
       requests: requests,
-      setHoldings: setHoldings,
+      addHoldings: addHoldings,
     };
 
     return service;
 
-    function setHoldings(items, currentUserId) {
-      var today = new Date();
-      angular.forEach(items, function(item) {
-        var status = item.metadata._circulation.status;
-        angular.forEach(item.metadata._circulation.holdings, function(holding) {
-          if (holding.user_id == currentUserId) {
-            holding.itemId = item.id;
-            if (Date.parse(holding.start_date) <= today &&
-                status == 'on_loan') {
-              loans.push(holding);
-            } else {
-              requests.push(holding);
-            }
-          }
-        });
+    function addHoldings(kind, holdings) {
+      // Loans and requests are separated by the server
+      var target = kind == 'loan' ? loans : requests;
+      angular.forEach(holdings, function(holding) {
+        holding.itemId = holding.item.pid;
+        target.push(holding);
       });
     }
   }
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Celery tasks for circulation events."""
+
+from __future__ import absolute_import, print_function
+
+from celery import shared_task
+from flask import current_app
+from invenio_db import db
+from invenio_webhooks.models import Event
+
+from .api import Item
+from .indexer import CirculationIndexer
+from .models import CirculationIdempotencyKey
+
+
+@shared_task(ignore_result=True)
+def process_event(event_id):
+    """Process a circulation event on a worker.
+
+    The receiver is run directly, as calling the receiver would dispatch the
+    event again. Successfully processed events get the status 200 to
+    distinguish them from accepted ones.
+    """
+    event = Event.query.get(event_id)
+    try:
+        event.receiver.run(event)
+        if event.response_code == 202:
+            event.response_code = 200
+            event.response = dict(status=200, message='Processed.')
+    except Exception as e:
+        current_app.logger.exception('Could not process event.')
+        db.session.rollback()
+        event = Event.query.get(event_id)
+        event.response_code = 500
+        event.response = dict(status=500, message=str(e))
+    db.session.add(event)
+    db.session.commit()
+
+
+@shared_task(ignore_result=True)
+def process_index_queue():
+    """Bulk index the circulation items changed since the last run."""
+    CirculationIndexer().process_queue()
+
+
+@shared_task(ignore_result=True)
+def purge_idempotency_keys():
+    """Delete the expired idempotency keys of circulation events."""
+    CirculationIdempotencyKey.purge()
+    db.session.commit()
+
+
+@shared_task(ignore_result=True)
+def reindex_items(ids):
+    """Bulk index a chunk of circulation items."""
+    success, errors = CirculationIndexer().reindex(ids)
+    if errors:
+        current_app.logger.error('Could not index %d of %d documents.',
+                                 errors, success + errors)
+
+
+@shared_task(ignore_result=True)
+def mark_overdue_loans():
+    """Mark the loans ended before today as overdue.
+
+    The run resumes after the last batch committed by previous runs.
+    """
+    count = Item.mark_overdue_loans()
+    current_app.logger.info('Marked %d items as overdue.', count)
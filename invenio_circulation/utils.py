@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Utilities for Invenio-Circulation."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+from collections import OrderedDict
+
+import six
+from flask import current_app, request
+from flask_login import current_user
+from jsonschema import Draft4Validator
+
+
+def authenticated_user_id():
+    """Get the id of the user of the OAuth token or of the session.
+
+    :returns: The user id or None for anonymous users.
+    """
+    if getattr(request, 'oauth', None) is not None:
+        return request.oauth.access_token.user_id
+    if current_user.is_authenticated:
+        return current_user.id
+    return None
+
+
+class LRUCache(object):
+    """Thread-safe mapping that evicts the least recently used entries."""
+
+    def __init__(self, maxsize=1024):
+        """Initialize the cache.
+
+        :param maxsize: Maximum number of entries.
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Get number of entries."""
+        return len(self._data)
+
+    def __contains__(self, key):
+        """Check if the cache contains the key."""
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Get the value of a key and mark it as recently used."""
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        """Set the value of a key, evicting the oldest entry if full."""
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Remove a key from the cache."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+
+
+class SchemaCache(object):
+    """Process-wide cache of resolved JSON schemas.
+
+    Every schema is resolved once together with all the schemas it
+    references, so validating a record neither fetches nor resolves the
+    schemas again.
+    """
+
+    def __init__(self):
+        """Initialize the cache."""
+        self._urls = {}
+        self._schemas = {}
+        self._lock = threading.Lock()
+
+    def url(self, path):
+        """Get the URL of a schema path registered in Invenio-JSONSchemas."""
+        key = (current_app.config.get('JSONSCHEMAS_HOST'), path)
+        if key not in self._urls:
+            self._urls[key] = current_app.extensions[
+                'invenio-jsonschemas'
+            ].path_to_url(path)
+        return self._urls[key]
+
+    def get(self, schema_url):
+        """Get a schema and the schemas it references.
+
+        :param schema_url: URL of the JSON schema.
+        :returns: Tuple (schema, store) with `store` mapping the URLs of all
+                  referenced schemas to their content.
+        """
+        entry = self._schemas.get(schema_url)
+        if entry is None:
+            with self._lock:
+                entry = self._schemas.get(schema_url)
+                if entry is None:
+                    entry = self._schemas[schema_url] = self._resolve(
+                        schema_url
+                    )
+        return entry
+
+    def validator(self, schema_url, schema=None, validator=None,
+                  format_checker=None):
+        """Get a validator for the schema with the given URL.
+
+        A new validator is returned on every call, as validators keep the
+        resolution scope while validating and cannot be shared by threads.
+
+        :param schema_url: URL of the JSON schema.
+        :param schema: Part of the schema to validate against. Defaults to
+                       the whole schema.
+        :param validator: Validator class. (Default:
+                          :class:`jsonschema.Draft4Validator`)
+        :param format_checker: A :class:`jsonschema.FormatChecker` instance.
+        :returns: An instance of the validator class.
+        """
+        resolved, store = self.get(schema_url)
+        resolver_cls = current_app.extensions['invenio-records'] \
+            .ref_resolver_cls
+        return (validator or Draft4Validator)(
+            resolved if schema is None else schema,
+            resolver=resolver_cls(schema_url, resolved, store=store),
+            types=current_app.config.get('RECORDS_VALIDATION_TYPES', {}),
+            format_checker=format_checker,
+        )
+
+    def invalidate(self, schema_url=None):
+        """Remove a schema, or all schemas if no URL is given."""
+        with self._lock:
+            if schema_url is None:
+                self._urls.clear()
+                self._schemas.clear()
+            else:
+                self._schemas.pop(schema_url, None)
+
+    @staticmethod
+    def _resolve(schema_url):
+        """Resolve a schema and all its references."""
+        resolver = current_app.extensions['invenio-records'] \
+            .ref_resolver_cls.from_schema({'$ref': schema_url})
+        seen = set()
+
+        def _resolve_refs(schema):
+            if isinstance(schema, dict):
+                if isinstance(schema.get('$ref'), six.string_types):
+                    url, resolved = resolver.resolve(schema['$ref'])
+                    if url not in seen:
+                        seen.add(url)
+                        resolver.push_scope(url)
+                        try:
+                            _resolve_refs(resolved)
+                        finally:
+                            resolver.pop_scope()
+                for value in schema.values():
+                    _resolve_refs(value)
+            elif isinstance(schema, list):
+                for value in schema:
+                    _resolve_refs(value)
+
+        with resolver.resolving(schema_url) as schema:
+            seen.add(schema_url)
+            _resolve_refs(schema)
+        return schema, dict(resolver.store)
+
+
+schema_cache = SchemaCache()
+"""Process-wide cache of the resolved JSON schemas."""
@@ -28,24 +28,23 @@
 
 import datetime
 import uuid
+from bisect import bisect_left, bisect_right
 
-from flask import current_app
 from flask_login import current_user
-from intervals import DateInterval, IllegalArgument
+from intervals import DateInterval
 from marshmallow import Schema, ValidationError, fields
-from marshmallow.decorators import validates, validates_schema
+from marshmallow.decorators import pre_load, validates, validates_schema
 
-from .models import ItemStatus
+from .models import ItemStatus, parse_date
+from .proxies import current_circulation_policy
 
 
 def _today():
-    return datetime.date.today()
+    return current_circulation_policy.today()
 
 
 def _max_loan_duration(start_date=None):
-    start_date = start_date or _today()
-    loan_duration = current_app.config['CIRCULATION_LOAN_PERIOD']
-    return start_date + datetime.timedelta(days=loan_duration)
+    return current_circulation_policy.loan_end_date(start_date)
 
 
 def _get_current_user_id():
@@ -85,6 +84,24 @@ class BaseSchema(Schema):
 
     dry_run = fields.Boolean(load_only=True)
 
+    @property
+    def policy(self):
+        """Get the circulation policy of the current application."""
+        return current_circulation_policy
+
+    @property
+    def today(self):
+        """Get the current date, fixed for a single validation."""
+        if 'today' not in self.context:
+            self.context['today'] = self.policy.today()
+        return self.context['today']
+
+    @pre_load
+    def reset_today(self, data):
+        """Take the current date anew for each validation of the schema."""
+        self.context.pop('today', None)
+        return data
+
 
 class LoanArgument(BaseSchema):
     """Marshmallow Schema class to validate Item.loan_item arguments."""
@@ -126,34 +143,83 @@ class ArgumentDurationMixin(object):
     @validates_schema
     def validate_duration(self, data):
         """Check if loan duration is valid."""
-        data.setdefault('start_date', _today())
-        data.setdefault('end_date', _max_loan_duration(data['start_date']))
+        data.setdefault('start_date', self.today)
+        data.setdefault('end_date',
+                        data['start_date'] + self.policy.loan_period)
 
-        duration = (data['end_date'] - data['start_date']).days
-        if duration > current_app.config['CIRCULATION_LOAN_PERIOD']:
+        duration = data['end_date'] - data['start_date']
+        if duration > self.policy.loan_period:
             raise ValidationError('Loan duration too long.')
 
 
-class HoldingSchema(Schema):
-    """Marshmallow mixin to check if holding overlaps with given interval."""
+class HoldingIntervals(object):
+    """Index of the date intervals blocked by the holdings of an item.
 
-    start_date = DateField()
-    end_date = DateField()
+    The intervals are kept sorted by their start date together with the
+    running maximum of their end dates, so that the holdings overlapping a
+    given interval are found by bisection.
+    """
 
-    @validates_schema
-    def validate_interval(self, data):
-        """Check if holding blocks the loan/request."""
-        # Create an interval for the currently checked holding
-        # holding['start_date'] -> holding['end_date']
-        holding_interval = DateInterval([data['start_date'], data['end_date']])
+    def __init__(self, holdings):
+        """Build the index from the holdings of an item."""
+        intervals = sorted(
+            (parse_date(hold['start_date']), parse_date(hold['end_date']),
+             position, hold['id'])
+            for position, hold in enumerate(holdings)
+            if hold.get('start_date') is not None and
+            hold.get('end_date') is not None
+        )
+        self._starts = [x[0] for x in intervals]
+        self._ends = [x[1] for x in intervals]
+        self._positions = [x[2] for x in intervals]
+        self._ids = [x[3] for x in intervals]
+
+        self._max_ends = []
+        for end in self._ends:
+            self._max_ends.append(
+                max(end, self._max_ends[-1]) if self._max_ends else end
+            )
+
+    def __len__(self):
+        """Get number of intervals."""
+        return len(self._starts)
+
+    def overlaps(self, start, end):
+        """Get the holdings overlapping the interval [start, end].
+
+        :returns: List[(id, DateInterval)] of the blocking holdings and
+                  their intersection with the given interval, in the order
+                  of the holdings.
+        """
+        first = bisect_left(self._max_ends, start)
+        last = bisect_right(self._starts, end)
+
+        result = sorted(
+            (self._positions[i], self._ids[i],
+             max(self._starts[i], start), min(self._ends[i], end))
+            for i in range(first, last) if self._ends[i] >= start
+        )
+        return [(id_, DateInterval([lower, upper]))
+                for _, id_, lower, upper in result]
 
-        # If there is an intersection between those two intervals, then the
-        # desired dates of the requested holding are not available
-        try:
-            intersection = holding_interval & self.context['request_interval']
-            raise ValidationError(intersection)
-        except IllegalArgument:
-            pass
+    def free(self, start, end):
+        """Get the date ranges within [start, end] without any holding.
+
+        :returns: List[(start, end)] of the free date ranges, sorted by date.
+        """
+        one_day = datetime.timedelta(days=1)
+        first = bisect_left(self._max_ends, start)
+        last = bisect_right(self._starts, end)
+
+        ranges = []
+        cursor = start
+        for i in range(first, last):
+            if self._starts[i] > cursor:
+                ranges.append((cursor, self._starts[i] - one_day))
+            cursor = max(cursor, self._ends[i] + one_day)
+        if cursor <= end:
+            ranges.append((cursor, end))
+        return ranges
 
 
 class ArgumentHoldingMixin(object):
@@ -164,20 +230,14 @@ class ArgumentHoldingMixin(object):
         """Check if another holding blocks the loan/request."""
         item = self.context['item']
 
-        start = data.get('start_date', _today())
-        end = data.get('end_date', _max_loan_duration(start))
-
-        # Create an interval for the requested/new holding
-        holding_schema = HoldingSchema(
-            context={'request_interval': DateInterval([start, end])}
-        )
-
-        errors = []
-        for hold in item.holdings:
-            current_error = holding_schema.validate(hold)
+        start = data.get('start_date', self.today)
+        end = data.get('end_date', start + self.policy.loan_period)
 
-            if current_error:
-                errors.append((hold['id'], current_error))
+        errors = [
+            (id_, {'_schema': [intersection]})
+            for id_, intersection in
+            HoldingIntervals(item.holdings).overlaps(start, end)
+        ]
 
         if errors:
             raise ValidationError(errors)
@@ -190,7 +250,7 @@ class LoanItemSchema(ArgumentDurationMixin, ArgumentHoldingMixin,
     @validates('start_date')
     def validate_start(self, start_date):
         """Check if start_date is today."""
-        if start_date != datetime.date.today():
+        if start_date != self.today:
             raise ValidationError('Start date must be today.')
 
     @validates_schema
@@ -208,7 +268,7 @@ class RequestItemSchema(ArgumentDurationMixin, ArgumentHoldingMixin,
     @validates('start_date')
     def validate_start(self, start_date):
         """Check if start_date is today."""
-        if start_date < datetime.date.today():
+        if start_date < self.today:
             raise ValidationError('Start date must be today or later.')
 
     @validates_schema
@@ -232,11 +292,10 @@ class ReturnItemSchema(BaseSchema):
 
         # An active loan exists if item.holding[0]['start_date'] is today (the
         # momemnt the item is returned) or earlier. Otherwise, it's a request
-        holding_start_date = datetime.datetime.strptime(
-            item.holdings[0]['start_date'],
-            current_app.config['CIRCULATION_DATE_FORMAT']
-        ).date()
-        if _today() < holding_start_date:
+        holding_start_date = self.policy.parse_date(
+            item.holdings[0]['start_date']
+        )
+        if self.today < holding_start_date:
             raise ValidationError('There is no active loan.')
 
 
@@ -273,8 +332,7 @@ class ExtendItemSchema(ExtensionArgument):
         if 'requested_end_date' not in data:
             return
 
-        loan_duration = current_app.config['CIRCULATION_LOAN_PERIOD']
-        max_loan = _today() + datetime.timedelta(days=loan_duration)
+        max_loan = self.today + self.policy.loan_period
 
         if data['requested_end_date'] > max_loan:
             raise ValidationError('The requested end date is too late.')
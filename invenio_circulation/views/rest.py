@@ -19,11 +19,28 @@
 
 """Invenio-Circulation REST interface."""
 
-from flask import Blueprint, abort
+import datetime
+import uuid
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, \
+    url_for
+from invenio_db import db
+from invenio_oauth2server import require_api_auth, require_oauth_scopes
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.models import RecordMetadata
 from invenio_records_rest.utils import obj_or_import_string
 from invenio_records_rest.views import \
     create_url_rules as records_rest_url_rules
+from invenio_records_rest.views import pass_record
 from invenio_rest import ContentNegotiatedMethodView
+from invenio_webhooks.models import Event
+from sqlalchemy import cast
+from sqlalchemy.dialects.postgresql import JSONB
+
+from ..metrics import metrics
+from ..models import CirculationHolding, HoldingKind, parse_date
+from ..proxies import current_circulation_policy
+from ..utils import authenticated_user_id
 
 
 def create_blueprint(endpoints):
@@ -40,4 +57,209 @@ def create_blueprint(endpoints):
         for rule in records_rest_url_rules(endpoint, **options):
             blueprint.add_url_rule(**rule)
 
+        record_class = obj_or_import_string(options.get('record_class'))
+        if hasattr(record_class, 'availability'):
+            blueprint.add_url_rule(
+                options['item_route'] + '/availability',
+                view_func=ItemAvailabilityResource.as_view(
+                    ItemAvailabilityResource.view_name.format(endpoint),
+                    record_class=record_class,
+                ),
+            )
+
+    blueprint.add_url_rule(
+        '/circulation/events/<string:event_id>',
+        view_func=EventStatusResource.as_view('event_status'),
+    )
+    blueprint.add_url_rule(
+        '/circulation/users/<int:user_id>/holdings',
+        view_func=UserHoldingsResource.as_view('user_holdings'),
+    )
+
     return blueprint
+
+
+def metrics_view():
+    """Render the circulation metrics of this process for Prometheus."""
+    return Response(metrics.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+def json_response(data, code=200, headers=None):
+    """Serialize the given data as a JSON response."""
+    response = jsonify(data)
+    response.status_code = code
+    if headers is not None:
+        response.headers.extend(headers)
+    return response
+
+
+class ItemAvailabilityResource(ContentNegotiatedMethodView):
+    """Resource for the free date ranges of an item."""
+
+    view_name = '{0}_availability'
+
+    def __init__(self, record_class=None, **kwargs):
+        """Initialize the resource."""
+        super(ItemAvailabilityResource, self).__init__(
+            serializers={'application/json': json_response},
+            **kwargs
+        )
+        self.record_class = record_class
+
+    @pass_record
+    def get(self, pid, record, **kwargs):
+        """Get the date ranges in which the item can be held.
+
+        The optional `start_date` and `end_date` arguments default to today
+        and `CIRCULATION_AVAILABILITY_PERIOD` days later.
+        """
+        period = current_app.config['CIRCULATION_AVAILABILITY_PERIOD']
+        try:
+            start = parse_date(request.args.get('start_date')) or \
+                current_circulation_policy.today()
+            end = parse_date(request.args.get('end_date')) or \
+                start + datetime.timedelta(days=period)
+        except ValueError:
+            abort(400)
+
+        item = self.record_class(record, model=record.model)
+        return self.make_response({
+            'available': [
+                {'start_date': lower.isoformat(),
+                 'end_date': upper.isoformat()}
+                for lower, upper in item.availability(start, end)
+            ],
+        })
+
+
+class EventStatusResource(ContentNegotiatedMethodView):
+    """Resource for the status of a circulation event."""
+
+    def __init__(self, **kwargs):
+        """Initialize the resource."""
+        super(EventStatusResource, self).__init__(
+            serializers={'application/json': json_response},
+            **kwargs
+        )
+
+    @require_api_auth()
+    @require_oauth_scopes('webhooks:event')
+    def get(self, event_id, **kwargs):
+        """Get the status and response of an event of the current user."""
+        try:
+            event_id = uuid.UUID(event_id)
+        except ValueError:
+            abort(404)
+
+        event = db.session.query(
+            Event.receiver_id, Event.response_code, Event.response
+        ).filter(
+            Event.id == event_id,
+            Event.user_id == authenticated_user_id(),
+        ).first()
+        if event is None:
+            abort(404)
+
+        return self.make_response({
+            'id': str(event_id),
+            'receiver_id': event.receiver_id,
+            'status': event.response_code,
+            'response': event.response,
+        })
+
+
+class UserHoldingsResource(ContentNegotiatedMethodView):
+    """Resource for the loans and requests of a user."""
+
+    def __init__(self, **kwargs):
+        """Initialize the resource."""
+        super(UserHoldingsResource, self).__init__(
+            serializers={'application/json': json_response},
+            **kwargs
+        )
+
+    @require_api_auth()
+    def get(self, user_id, **kwargs):
+        """Get a page of the holdings of the current user.
+
+        The optional `kind` argument restricts the holdings to loans or
+        requests. The holdings are ordered by their start date and carry
+        the PID and title of their item, of which only the title is read.
+        """
+        if user_id != authenticated_user_id():
+            abort(403)
+
+        kind = request.args.get('kind')
+        if kind not in (None, HoldingKind.LOAN, HoldingKind.REQUEST):
+            abort(400)
+        page = request.args.get('page', 1, type=int)
+        size = request.args.get(
+            'size', current_app.config['CIRCULATION_USER_HOLDINGS_SIZE'],
+            type=int)
+        if page < 1 or not 0 < size <= \
+                current_app.config['CIRCULATION_USER_HOLDINGS_MAX_SIZE']:
+            abort(400)
+
+        query = CirculationHolding.query.filter_by(user_id=user_id)
+        if kind is not None:
+            query = query.filter_by(kind=kind)
+        query = query.join(
+            RecordMetadata, RecordMetadata.id == CirculationHolding.item_id,
+        ).outerjoin(
+            PersistentIdentifier, db.and_(
+                PersistentIdentifier.object_uuid == CirculationHolding.item_id,
+                PersistentIdentifier.object_type == 'rec',
+                PersistentIdentifier.pid_type == 'crcitm',
+                PersistentIdentifier.status == PIDStatus.REGISTERED,
+            ),
+        ).filter(
+            # Holdings of deleted items stay until the item is removed
+            RecordMetadata.json != None,  # noqa
+        )
+        total = query.count()
+
+        rows = query.with_entities(
+            CirculationHolding, PersistentIdentifier.pid_value,
+            cast(RecordMetadata.json, JSONB)[
+                ('title_statement', 'title')].astext,
+        ).order_by(
+            CirculationHolding.start_date, CirculationHolding.holding_id,
+        ).offset((page - 1) * size).limit(size)
+
+        def link(page):
+            return url_for('circulation_rest.user_holdings', user_id=user_id,
+                           kind=kind, page=page, size=size, _external=True)
+
+        links = {'self': link(page)}
+        if page > 1:
+            links['prev'] = link(page - 1)
+        if page * size < total:
+            links['next'] = link(page + 1)
+
+        return self.make_response({
+            'hits': {
+                'hits': [
+                    self.dump_holding(holding, pid_value, title)
+                    for holding, pid_value, title in rows
+                ],
+                'total': total,
+            },
+            'links': links,
+        })
+
+    @staticmethod
+    def dump_holding(holding, pid_value, title):
+        """Serialize a holding together with its item."""
+        return {
+            'id': str(holding.holding_id),
+            'kind': holding.kind,
+            'start_date': holding.start_date and
+            holding.start_date.isoformat(),
+            'end_date': holding.end_date and holding.end_date.isoformat(),
+            'delivery': holding.delivery,
+            'item': {
+                'pid': pid_value,
+                'title': title,
+            },
+        }
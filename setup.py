@@ -103,10 +103,22 @@ setup(
         'invenio_base.apps': [
             'invenio_circulation = invenio_circulation:InvenioCirculation',
         ],
+        'invenio_base.cli': [
+            'circulation = invenio_circulation.cli:circulation',
+        ],
         'invenio_base.api_apps': [
             'invenio_circulation_rest'
             ' = invenio_circulation:InvenioCirculationREST',
         ],
+        'invenio_celery.tasks': [
+            'invenio_circulation = invenio_circulation.tasks',
+        ],
+        'invenio_db.alembic': [
+            'invenio_circulation = invenio_circulation:alembic',
+        ],
+        'invenio_db.models': [
+            'invenio_circulation = invenio_circulation.models',
+        ],
         'invenio_i18n.translations': [
             'messages = invenio_circulation',
         ],
@@ -84,6 +84,7 @@ def app(request):
         SERVER_NAME='localhost:5000',
         REPLACE_REFS=False,
         TESTING=True,
+        CIRCULATION_INDEXER_DEFERRED=False,
         CIRCULATION_ACTION_LOAN_URL=(
             '/hooks/receivers/circulation_loan/events/'),
         CIRCULATION_ACTION_REQUEST_URL=(
@@ -157,6 +158,9 @@ def access_token(app, db):
 @pytest.yield_fixture()
 def es(app):
     """Elasticsearch fixture."""
+    # Items created without this fixture may have created the state index
+    current_search_client.indices.delete(
+        index=app.config['CIRCULATION_ITEM_STATE_INDEX'], ignore=[404])
     try:
         list(current_search.create())
     except RequestError:
@@ -25,11 +25,23 @@
 
 """Elasticsearch tests."""
 
+import json
+import uuid
+
+import pytest
 from invenio_indexer.api import RecordIndexer
+from invenio_records_rest.serializers.schemas.json import RecordSchemaJSONV1
 from invenio_search import current_search
+from werkzeug.exceptions import Forbidden, Unauthorized
 
-from invenio_circulation.api import Item
-from invenio_circulation.search import ItemSearch
+from invenio_circulation.api import Item, ItemStatus
+from invenio_circulation.fetchers import circulation_item_fetcher
+from invenio_circulation.indexer import CirculationIndexer
+from invenio_circulation.minters import circulation_item_minter
+from invenio_circulation.search import ItemSearch, ItemStateSearch, \
+    user_holdings_search_factory
+from invenio_circulation.serializers import HoldingsJSONSerializer, \
+    ItemJSONSerializer
 
 
 def test_basic_search(app, db, es):
@@ -62,3 +74,98 @@ def test_basic_search(app, db, es):
 
     # Search for nonsense
     assert len(ItemSearch().query('match', foo='banana').execute()) == 0
+
+
+def test_user_holdings_search(app, db, es, monkeypatch):
+    """Test that only the holdings of the user are returned."""
+    item1 = Item.create({})
+    item1.loan_item(user_id=1)
+    item1.request_item(user_id=2)
+    item1.commit()
+    item2 = Item.create({})
+    item2.request_item(user_id=2)
+    item2.commit()
+    db.session.commit()
+
+    CirculationIndexer().index_states([item1, item2])
+    current_search.flush_and_refresh('_all')
+
+    with app.test_request_context('/?user_id=1'):
+        with pytest.raises(Unauthorized):
+            user_holdings_search_factory(None, ItemStateSearch())
+
+    monkeypatch.setattr('invenio_circulation.search.authenticated_user_id',
+                        lambda: 1)
+    with app.test_request_context('/?user_id=2'):
+        with pytest.raises(Forbidden):
+            user_holdings_search_factory(None, ItemStateSearch())
+
+    with app.test_request_context('/?user_id=1'):
+        search, urlkwargs = user_holdings_search_factory(
+            None, ItemStateSearch())
+    assert urlkwargs['user_id'] == 1
+
+    hits = search.execute().to_dict()['hits']['hits']
+    assert [hit['_id'] for hit in hits] == [str(item1.id)]
+    assert 'holdings' not in hits[0]['_source']['_circulation']
+
+    record = HoldingsJSONSerializer.preprocess_search_hit(None, hits[0])
+    holdings = record['metadata']['_circulation']['holdings']
+    assert [holding['user_id'] for holding in holdings] == [1]
+
+
+def test_item_state_search(app, db, es):
+    """Test that item hits get the circulation state from its index."""
+    item_uuid = uuid.uuid4()
+    item_data = {'foo': 'bar'}
+    circulation_item_minter(item_uuid, item_data)
+    item = Item.create(item_data, id_=item_uuid)
+    item.loan_item(user_id=1)
+    item.commit()
+    db.session.commit()
+
+    RecordIndexer().index(item)
+    CirculationIndexer().index_states([item])
+    current_search.flush_and_refresh('_all')
+
+    result = ItemSearch().execute().to_dict()
+    assert '_circulation' not in result['hits']['hits'][0]['_source']
+
+    data = json.loads(ItemJSONSerializer(RecordSchemaJSONV1).serialize_search(
+        circulation_item_fetcher, result))
+    circulation = data['hits']['hits'][0]['metadata']['_circulation']
+    assert circulation['status'] == item['_circulation']['status']
+    assert circulation['holdings'][0]['user_id'] == 1
+
+    app.config['CIRCULATION_ITEM_STATE_INDEX'] = None
+    RecordIndexer().index(item)
+    current_search.flush_and_refresh('_all')
+
+    result = ItemSearch().execute().to_dict()
+    assert '_circulation' in result['hits']['hits'][0]['_source']
+
+
+def test_created_item_state_search(app, db, es):
+    """Test that a created item is found with its circulation state."""
+    item_uuid = uuid.uuid4()
+    item_data = {}
+    circulation_item_minter(item_uuid, item_data)
+    item = Item.create(item_data, id_=item_uuid)
+    db.session.commit()
+
+    RecordIndexer().index(item)
+    current_search.flush_and_refresh('_all')
+
+    assert [hit.meta.id for hit in ItemStateSearch().execute()] == \
+        [str(item.id)]
+
+    result = ItemSearch().execute().to_dict()
+    data = json.loads(ItemJSONSerializer(RecordSchemaJSONV1).serialize_search(
+        circulation_item_fetcher, result))
+    circulation = data['hits']['hits'][0]['metadata']['_circulation']
+    assert circulation['status'] == ItemStatus.ON_SHELF
+
+    item.delete()
+    db.session.commit()
+    current_search.flush_and_refresh('_all')
+    assert len(ItemStateSearch().execute()) == 0
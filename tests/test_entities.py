@@ -26,12 +26,22 @@
 """Module entities tests."""
 
 import datetime
+import uuid
 
 import pytest
-from invenio_pidstore.errors import PIDInvalidAction
+from invenio_pidstore.errors import PIDDeletedError, PIDDoesNotExistError, \
+    PIDInvalidAction
+from jsonschema import Draft4Validator, FormatChecker
+from jsonschema.exceptions import ValidationError
+from sqlalchemy.orm.exc import StaleDataError
 
-from invenio_circulation.api import Item, ItemStatus, Location
-from invenio_circulation.validators import LoanItemSchema
+from invenio_circulation.api import CIRCULATION_ACTIONS, OVERDUE_CHECKPOINT, \
+    Item, ItemStatus, Location
+from invenio_circulation.indexer import CirculationIndexer
+from invenio_circulation.minters import circulation_item_minter
+from invenio_circulation.models import CirculationCheckpoint
+from invenio_circulation.validators import BaseSchema, LoanItemSchema, \
+    RequestItemSchema
 
 
 def test_location_create(app, db):
@@ -194,6 +204,76 @@ def test_item_find_by_holding(app, db, arguments, assertions):
         assert assertion(res, item)
 
 
+def test_item_find_by_holding_current_only(app, db):
+    today = datetime.date.today()
+
+    item1 = Item.create({})
+    item2 = Item.create({})
+    db.session.commit()
+
+    # item1: returned loan of user 1, active loan of user 2
+    item1.loan_item(**LoanItemSchema().dump({'user_id': 1}).data)
+    item1.return_item()
+    item1.commit()
+    db.session.commit()
+    item1.loan_item(**LoanItemSchema().dump({'user_id': 2}).data)
+    item1.commit()
+
+    # item2: request of user 2 in two weeks
+    item2.request_item(**RequestItemSchema().dump({
+        'user_id': 2,
+        'start_date': today + datetime.timedelta(weeks=2),
+    }).data)
+    item2.commit()
+    db.session.commit()
+
+    def find(**kwargs):
+        return set(x[0] for x in Item.find_by_holding(current_only=True,
+                                                      **kwargs))
+
+    assert find(user_id=1) == set()
+    assert find(user_id=2) == {item1.id, item2.id}
+    assert find(user_id=2, start_date=today) == {item1.id}
+    assert find(start_date=[today + datetime.timedelta(weeks=1),
+                            today + datetime.timedelta(weeks=3)]) == \
+        {item2.id}
+    assert find(user_id=1, start_date=[today, today]) == set()
+
+    # The history still contains the returned loan
+    assert item1.id in set(x[0] for x in Item.find_by_holding(user_id=1))
+
+    with pytest.raises(ValueError):
+        find(start_date=[1])
+
+
+def test_item_find_by_holding_pagination(app, db):
+    items = [Item.create({}) for _ in range(5)]
+    for item in items:
+        item.request_item(**RequestItemSchema().dump({'user_id': 1}).data)
+        item.commit()
+    db.session.commit()
+
+    ids = sorted(item.id for item in items)
+
+    # Keyset pagination
+    pages = []
+    after = None
+    while True:
+        page = list(Item.find_by_holding(current_only=True, after=after,
+                                         limit=2, user_id=1))
+        if not page:
+            break
+        pages.append([x[0] for x in page])
+        after = page[-1]
+    assert pages == [ids[0:2], ids[2:4], ids[4:]]
+
+    # Materialized items fetched in chunks
+    found = list(Item.find_items_by_holding(chunk_size=2, user_id=1))
+    assert all(isinstance(x, Item) for x in found)
+    assert sorted(x.id for x in found) == ids
+    assert list(Item.find_items_by_holding(user_id=2)) == []
+
+
 def test_item_find_by_holding_value_error(app, db):
     # Raises for less than two values
     with pytest.raises(ValueError):
@@ -202,3 +282,199 @@ def test_item_find_by_holding_value_error(app, db):
     # Raises for three or more values
     with pytest.raises(ValueError):
         list(Item.find_by_holding(start_date=[1, 2, 3]))
+
+
+def test_item_bulk_apply(app, db, monkeypatch):
+    indexed = []
+    monkeypatch.setattr('invenio_circulation.indexer.bulk',
+                        lambda client, actions, **kwargs: indexed.append(
+                            [action['_id'] for action in actions]) or (1, 0))
+    app.config['CIRCULATION_ITEM_STATE_INDEX'] = None
+
+    item1 = Item.create({})
+    item2 = Item.create({})
+    item3 = Item.create({})
+    item3.lose_item()
+    item3.commit()
+    db.session.commit()
+
+    missing_id = uuid.uuid4()
+    res = Item.bulk_apply('loan_item', [
+        (item1.id, {'user_id': 1}),
+        (item2.id, {'user_id': 2, 'dry_run': True}),
+        (item3.id, {'user_id': 3}),
+        (missing_id, {'user_id': 4}),
+    ])
+    db.session.commit()
+
+    assert [x[0] for x in res] == [item1.id, item2.id, item3.id, missing_id]
+    assert res[0][1] is None
+    assert res[1][1] is None
+    assert res[2][1]['status'] == 400
+    assert res[3][1] == {'status': 404, 'message': 'The item does not exist.'}
+    assert indexed == [[str(item1.id)]]
+
+    item1 = Item.get_record(item1.id)
+    assert item1['_circulation']['status'] == ItemStatus.ON_LOAN
+    assert item1.holdings[0]['user_id'] == 1
+
+    item2 = Item.get_record(item2.id)
+    assert item2['_circulation']['status'] == ItemStatus.ON_SHELF
+    assert len(item2.holdings) == 0
+
+    res = Item.bulk_apply('return_item', [(item1.id, {})])
+    db.session.commit()
+
+    assert res == [(item1.id, None)]
+    item1 = Item.get_record(item1.id)
+    assert item1['_circulation']['status'] == ItemStatus.ON_SHELF
+
+    # A stale item fails on its own
+    def stale(item, data):
+        raise StaleDataError()
+
+    monkeypatch.setitem(CIRCULATION_ACTIONS, 'lose_item', (BaseSchema, stale))
+    res = Item.bulk_apply('lose_item', [(item1.id, {}), (item2, {})])
+    assert [error['status'] for _, error in res] == [409, 409]
+
+
+def test_item_availability(app, db):
+    today = datetime.date.today()
+    days = datetime.timedelta
+
+    item = Item.create({})
+    item.request_item(**RequestItemSchema().dump({
+        'start_date': today + days(5),
+        'end_date': today + days(10),
+    }).data)
+    item.commit()
+    db.session.commit()
+
+    assert item.availability(today, today + days(20)) == [
+        (today, today + days(4)),
+        (today + days(11), today + days(20)),
+    ]
+    assert item.availability(today + days(6), today + days(8)) == []
+
+    # A new revision is not answered from the cache
+    item.request_item(**RequestItemSchema().dump({
+        'start_date': today + days(15),
+        'end_date': today + days(20),
+    }).data)
+    item.commit()
+    db.session.commit()
+
+    assert item.availability(today, today + days(20)) == [
+        (today, today + days(4)),
+        (today + days(11), today + days(14)),
+    ]
+
+    item.lose_item()
+    assert item.availability(today, today + days(20)) == []
+
+
+def test_item_commit_circulation_only(app, db):
+    item = Item.create({})
+    db.session.commit()
+
+    # Bibliographic fields are not validated for circulation changes
+    item['control_number'] = 1
+    item.loan_item()
+    item.commit(circulation_only=True)
+
+    with pytest.raises(ValidationError):
+        item.commit()
+
+    # The circulation part is still validated
+    item['control_number'] = '1'
+    item['_circulation']['status'] = 'foo'
+    with pytest.raises(ValidationError):
+        item.commit(circulation_only=True)
+
+
+def test_item_validate_arguments(app, db):
+    checked = []
+
+    class Validator(Draft4Validator):
+        def validate(self, *args, **kwargs):
+            checked.append(self.format_checker)
+            return super(Validator, self).validate(*args, **kwargs)
+
+    item = Item.create({})
+    format_checker = FormatChecker()
+    assert item.validate(validator=Validator, format_checker=format_checker)
+    assert checked == [format_checker]
+
+    item._circulation_only = True
+    assert item.validate(validator=Validator, format_checker=format_checker)
+    assert checked == [format_checker, format_checker]
+
+
+def test_item_get_record_by_pid(app, db):
+    item_uuid = uuid.uuid4()
+    item_data = {}
+    pid = circulation_item_minter(item_uuid, item_data)
+    item = Item.create(item_data, id_=item_uuid)
+    db.session.commit()
+
+    assert Item.get_record_by_pid(pid.pid_value).id == item.id
+    assert Item.get_record_by_pid(pid.pid_value, for_update=True).id == \
+        item.id
+
+    # The PID is resolved anew on every lookup
+    other_uuid = uuid.uuid4()
+    Item.create({}, id_=other_uuid)
+    pid.object_uuid = other_uuid
+    db.session.commit()
+    assert Item.get_record_by_pid(pid.pid_value).id == other_uuid
+
+    pid.delete()
+    db.session.commit()
+    with pytest.raises(PIDDeletedError):
+        Item.get_record_by_pid(pid.pid_value)
+
+    with pytest.raises(PIDDoesNotExistError):
+        Item.get_record_by_pid('does-not-exist')
+
+
+def test_mark_overdue_loans(app, db, monkeypatch):
+    indexed = []
+    monkeypatch.setattr(CirculationIndexer, 'index',
+                        lambda self, items: indexed.extend(
+                            item.id for item in items))
+    today = datetime.date.today()
+
+    def loaned_item(days):
+        item = Item.create({})
+        item.loan_item(start_date=str(today - datetime.timedelta(days=30)),
+                       end_date=str(today + datetime.timedelta(days=days)))
+        item.commit()
+        return item
+
+    item1 = loaned_item(-3)
+    item2 = loaned_item(-1)
+    item3 = loaned_item(0)
+    db.session.commit()
+    del indexed[:]
+
+    assert Item.mark_overdue_loans(today=today, batch_size=1) == 2
+    assert indexed == [item1.id, item2.id]
+    for item, status in ((item1, ItemStatus.OVERDUE),
+                         (item2, ItemStatus.OVERDUE),
+                         (item3, ItemStatus.ON_LOAN)):
+        assert Item.get_record(item.id)['_circulation']['status'] == status
+    assert CirculationCheckpoint.get(OVERDUE_CHECKPOINT)[0] == \
+        str(today - datetime.timedelta(days=1))
+
+    # Later runs resume after the checkpoint
+    tomorrow = today + datetime.timedelta(days=1)
+    assert Item.mark_overdue_loans(today=tomorrow) == 1
+    assert indexed[-1] == item3.id
+
+    # Overdue loans can be extended and returned
+    item1 = Item.get_record(item1.id)
+    item1.extend_loan(str(tomorrow))
+    assert item1['_circulation']['status'] == ItemStatus.ON_LOAN
+    item2 = Item.get_record(item2.id)
+    item2.return_item()
+    assert item2['_circulation']['status'] == ItemStatus.ON_SHELF
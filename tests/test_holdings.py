@@ -86,3 +86,57 @@ def test_holding_values(app, db, action, schema):
     assert 'waitlist' in holding
     assert 'delivery' in holding
     assert 'user_id' in holding
+
+
+def test_holdings_index(app, db):
+    """Test the holding id index of Item.holdings."""
+    item = Item.create({})
+    assert item.holdings is item.holdings
+
+    ids = [str(uuid.uuid4()) for _ in range(5)]
+    for id_ in ids[1:4]:
+        item.holdings.append(Holding.create(id_=id_))
+    item.holdings.insert(0, Holding.create(id_=ids[0]))
+    item.holdings.append(Holding.create(id_=ids[4]))
+    assert all(id_ in item.holdings for id_ in ids)
+    assert uuid.UUID(ids[2]) in item.holdings
+
+    # Remove from the front, the middle and the end
+    assert item.holdings.pop(0)['id'] == ids[0]
+    del item.holdings[ids[2]]
+    assert item.holdings.pop()['id'] == ids[4]
+    assert [x['id'] for x in item.holdings] == [ids[1], ids[3]]
+    assert ids[0] not in item.holdings
+    assert ids[3] in item.holdings
+
+    del item.holdings[ids[3]]
+    assert [x['id'] for x in item.holdings] == [ids[1]]
+
+    with pytest.raises(ValueError):
+        del item.holdings[ids[3]]
+
+    # Changes to the underlying list are picked up
+    item['_circulation']['holdings'].insert(0, Holding.create(id_=ids[0]))
+    assert ids[0] in item.holdings
+    item['_circulation']['holdings'] = [Holding.create(id_=ids[2])]
+    assert ids[2] in item.holdings
+    assert ids[1] not in item.holdings
+
+    # Changes keeping the length of the list are picked up too
+    item['_circulation']['holdings'][0] = Holding.create(id_=ids[3])
+    assert ids[3] in item.holdings
+    item['_circulation']['holdings'].insert(0, Holding.create(id_=ids[4]))
+    item['_circulation']['holdings'].pop()
+    assert ids[4] in item.holdings
+    del item.holdings[ids[4]]
+    assert len(item.holdings) == 0
+
+
+def test_lose_item_cancels_all_holdings(app, db):
+    """Test that losing an item cancels every holding."""
+    item = Item.create({})
+    for _ in range(5):
+        item.holdings.append(Holding.create())
+
+    item.lose_item()
+    assert len(item.holdings) == 0
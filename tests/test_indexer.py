@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Module indexer tests."""
+
+import datetime
+
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+from invenio_search import current_search
+
+from invenio_circulation.api import Item, ItemStatus
+from invenio_circulation.cli import reindex
+from invenio_circulation.indexer import CirculationIndexer
+from invenio_circulation.minters import circulation_item_minter
+from invenio_circulation.search import ItemSearch, ItemStateSearch
+
+
+def test_deferred_indexing(app, db, monkeypatch):
+    """Test that changed items are published once after commit."""
+    published = []
+    monkeypatch.setattr(CirculationIndexer, 'publish',
+                        lambda self, ids: published.append(list(ids)))
+    app.config['CIRCULATION_INDEXER_DEFERRED'] = True
+
+    item1 = Item.create({})
+    item2 = Item.create({})
+    indexer = CirculationIndexer()
+
+    indexer.index([item1])
+    with db.session.begin_nested():
+        indexer.index([item2, item1])
+    assert published == []
+
+    db.session.commit()
+    assert published == [[str(item1.id), str(item2.id)]]
+
+    indexer.index([item2])
+    db.session.rollback()
+    db.session.commit()
+    assert published == [[str(item1.id), str(item2.id)]]
+
+
+def test_state_document(app, db):
+    """Test the circulation state document of an item."""
+    item = Item.create({'control_number': '1'})
+    item.loan_item(user_id=1)
+
+    doc = CirculationIndexer.state_document(item)
+    assert set(doc) == {'control_number', 'location', '_circulation'}
+    assert doc['control_number'] == '1'
+    assert doc['_circulation']['status'] == item['_circulation']['status']
+    assert doc['_circulation']['holdings'][0]['user_id'] == 1
+
+
+def test_reindex_command(app, db, monkeypatch):
+    """Test that the reindex command indexes the items in chunks."""
+    chunks = []
+    monkeypatch.setattr(CirculationIndexer, 'reindex',
+                        lambda self, ids: chunks.append(ids) or (len(ids), 0))
+
+    items = []
+    for _ in range(3):
+        item = Item.create({})
+        circulation_item_minter(item.id, item)
+        items.append(item)
+    Item.create({})
+    db.session.commit()
+
+    runner = CliRunner()
+    script_info = ScriptInfo(create_app=lambda info: app)
+
+    res = runner.invoke(reindex, ['--yes-i-know', '-s', '2'],
+                        obj=script_info)
+    assert res.exit_code == 0
+    assert [len(ids) for ids in chunks] == [2, 1]
+    assert set(id_ for ids in chunks for id_ in ids) == \
+        set(item.id for item in items)
+
+    del chunks[:]
+    since = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    res = runner.invoke(reindex, ['--yes-i-know', '--since',
+                                  since.strftime('%Y-%m-%d')],
+                        obj=script_info)
+    assert res.exit_code == 0
+    assert chunks == []
+
+    res = runner.invoke(reindex, ['--yes-i-know', '--since', 'foo'],
+                        obj=script_info)
+    assert res.exit_code != 0
+
+
+def test_reindex_command_index(app, db, es):
+    """Test that the reindex command indexes whole items and states."""
+    items = []
+    for _ in range(3):
+        item = Item.create({'foo': 'bar'})
+        circulation_item_minter(item.id, item)
+        items.append(item)
+    db.session.commit()
+
+    # A newer indexed state makes its item fail
+    es.index(index=app.config['CIRCULATION_ITEM_STATE_INDEX'],
+             doc_type=app.config['CIRCULATION_ITEM_STATE_DOC_TYPE'],
+             id=str(items[0].id), body={},
+             version=items[0].revision_id + 1, version_type='external')
+
+    runner = CliRunner()
+    script_info = ScriptInfo(create_app=lambda info: app)
+
+    res = runner.invoke(reindex, ['--yes-i-know', '-s', '2'],
+                        obj=script_info)
+    assert res.exit_code != 0
+    assert '1 documents could not be indexed.' in res.output
+
+    current_search.flush_and_refresh('_all')
+    assert len(ItemSearch().execute()) == 3
+    hits = dict((hit['_id'], hit['_source']) for hit in
+                ItemStateSearch().execute().to_dict()['hits']['hits'])
+    assert hits.pop(str(items[0].id)) == {}
+    assert set(hits) == set(str(item.id) for item in items[1:])
+    for doc in hits.values():
+        assert doc['_circulation']['status'] == ItemStatus.ON_SHELF
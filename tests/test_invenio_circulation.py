@@ -27,12 +27,16 @@
 
 from __future__ import absolute_import, print_function
 
+import datetime
+
 import pytest
 from flask import Flask
 from invenio_records_rest.utils import PIDConverter
 
 from invenio_circulation import InvenioCirculation
-from invenio_circulation.proxies import current_circulation
+from invenio_circulation.proxies import current_circulation, \
+    current_circulation_policy
+from invenio_circulation.utils import schema_cache
 
 
 def test_version():
@@ -60,3 +64,34 @@ def test_init():
     with app.app_context():
         assert (app.extensions['invenio-circulation'] ==
                 current_circulation._get_current_object())
+
+
+def test_schema_cache(app):
+    """Test the cache of the circulation JSON schemas."""
+    url = schema_cache.url(app.config['CIRCULATION_ITEM_SCHEMA'])
+    assert url == schema_cache.url(app.config['CIRCULATION_ITEM_SCHEMA'])
+
+    # The schemas are loaded at initialization, including references
+    schema, store = schema_cache.get(url)
+    assert schema_cache.get(url)[0] is schema
+    assert any(x.endswith('loan-cycle-v1.0.0.json') for x in store)
+
+    validator = schema_cache.validator(url)
+    assert validator.is_valid({'_circulation': {'status': 'on_shelf'}})
+    assert not validator.is_valid({'_circulation': {'status': 'foo'}})
+
+    # Invalidated schemas are loaded again
+    current_circulation.invalidate_schemas()
+    assert url not in schema_cache._schemas
+    assert schema_cache.get(url)[0] == schema
+
+
+def test_policy_parse_date(app):
+    """Test the parsing of holding dates by the circulation policy."""
+    date = current_circulation_policy.parse_date('2016-01-02')
+    assert date == datetime.date(2016, 1, 2)
+    assert current_circulation_policy.parse_date('2016-01-02') is date
+    assert current_circulation_policy.parse_date(date) is date
+    assert current_circulation_policy.parse_date(None) is None
+    assert current_circulation_policy.loan_end_date(date) == \
+        datetime.date(2016, 1, 2 + app.config['CIRCULATION_LOAN_PERIOD'])
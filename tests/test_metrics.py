@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Module metrics tests."""
+
+import pytest
+
+from invenio_circulation.metrics import MetricsRegistry, count_statement, phase
+
+
+class Event(object):
+    """Stand-in for a webhook event."""
+
+    receiver_id = 'circulation_loan'
+    response_code = 202
+
+
+def test_metrics_registry():
+    """Test the aggregation and rendering of event metrics."""
+    registry = MetricsRegistry()
+    event = Event()
+
+    with registry.measure(event):
+        with phase('resolve'):
+            count_statement(None, None, 'SELECT 1', None, None, False)
+        with phase('commit'):
+            count_statement(None, None, 'UPDATE', None, None, False)
+
+    event.response_code = 400
+    with registry.measure(event):
+        with phase('validate'):
+            pass
+
+    with pytest.raises(RuntimeError):
+        with registry.measure(event):
+            raise RuntimeError()
+
+    # Outside of an event nothing is recorded
+    with phase('resolve'):
+        count_statement(None, None, 'SELECT 1', None, None, False)
+
+    text = registry.render()
+    assert 'circulation_event_duration_seconds_count{' \
+        'outcome="success",receiver="circulation_loan"} 1' in text
+    assert 'circulation_event_duration_seconds_count{' \
+        'outcome="400",receiver="circulation_loan"} 1' in text
+    assert 'circulation_event_duration_seconds_count{' \
+        'outcome="500",receiver="circulation_loan"} 1' in text
+    assert 'circulation_event_phase_duration_seconds_count{' \
+        'outcome="success",phase="commit",receiver="circulation_loan"} 1' \
+        in text
+    assert 'circulation_event_sql_statements_sum{' \
+        'outcome="success",receiver="circulation_loan"} 2' in text
+
+    registry.clear()
+    assert 'circulation_loan' not in registry.render()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Invenio.
+# Copyright (C) 2016 CERN.
+#
+# Invenio is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Invenio is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Invenio; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Module model tests."""
+
+import datetime
+
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+
+from invenio_circulation.api import Item
+from invenio_circulation.cli import sync_holdings
+from invenio_circulation.minters import circulation_item_minter
+from invenio_circulation.models import CirculationHolding, HoldingKind
+from invenio_circulation.validators import LoanItemSchema, RequestItemSchema
+
+
+def test_circulation_holding_sync(app, db):
+    """Test that CirculationHolding mirrors the item holdings."""
+    item = Item.create({})
+    db.session.commit()
+
+    today = datetime.date.today()
+
+    # Loan the item
+    item.loan_item(**LoanItemSchema().dump({'user_id': 1}).data)
+    loan_id = item.holdings[0]['id']
+
+    # Request the item after the loan
+    item.request_item(**RequestItemSchema().dump({
+        'user_id': 2,
+        'start_date': today + datetime.timedelta(weeks=5),
+    }).data)
+    request_id = item.holdings[1]['id']
+    item.commit()
+    db.session.commit()
+
+    loan = CirculationHolding.query.get(loan_id)
+    assert loan.item_id == item.id
+    assert loan.user_id == 1
+    assert loan.kind == HoldingKind.LOAN
+    assert loan.start_date == today
+    assert loan.delivery == 'mail'
+
+    request = CirculationHolding.query.filter_by(user_id=2).one()
+    assert str(request.holding_id) == request_id
+    assert request.kind == HoldingKind.REQUEST
+    assert request.start_date == today + datetime.timedelta(weeks=5)
+
+    # Extend the loan
+    item.extend_loan(today.isoformat())
+    item.commit()
+    db.session.commit()
+    assert CirculationHolding.query.get(loan_id).end_date == today
+
+    # Return the item and cancel the request
+    item.return_item()
+    item.cancel_hold(request_id)
+    item.commit()
+    db.session.commit()
+    assert CirculationHolding.query.filter_by(item_id=item.id).count() == 0
+
+    # Rebuild the rows of an item
+    item.request_item()
+    item.commit()
+    CirculationHolding.query.delete()
+    CirculationHolding.sync(item)
+    db.session.commit()
+    assert CirculationHolding.query.filter_by(item_id=item.id).count() == 1
+
+
+def test_sync_holdings_command(app, db):
+    """Test that the holdings of existing items are backfilled."""
+    items = []
+    for user_id in (1, 2, 3):
+        item = Item.create({})
+        circulation_item_minter(item.id, item)
+        item.loan_item(user_id=user_id)
+        item.commit()
+        items.append(item)
+    db.session.commit()
+    CirculationHolding.query.delete()
+    db.session.commit()
+
+    runner = CliRunner()
+    script_info = ScriptInfo(create_app=lambda info: app)
+    res = runner.invoke(sync_holdings, ['-s', '2'], obj=script_info)
+    assert res.exit_code == 0
+
+    assert CirculationHolding.query.count() == 3
+    for user_id, item in enumerate(items, 1):
+        holding = CirculationHolding.query.filter_by(item_id=item.id).one()
+        assert holding.user_id == user_id
+        assert holding.kind == HoldingKind.LOAN
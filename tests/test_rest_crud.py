@@ -25,15 +25,19 @@
 
 """Module REST API tests."""
 
+import datetime
 import json
 
 import pytest
 from flask import url_for
 from invenio_indexer.api import RecordIndexer
+from invenio_oauth2server.models import Token
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_search import current_search
 
 from invenio_circulation.api import Item
 from invenio_circulation.minters import circulation_item_minter
+from invenio_circulation.validators import RequestItemSchema
 
 
 def test_crud_read(app, db, es):
@@ -86,3 +90,123 @@ def test_rest_search(app, db, es, url_addition, count):
             res = client.get(url)
             hits = json.loads(res.data.decode('utf-8'))['hits']['hits']
             assert len(hits) == count
+
+
+def test_item_availability(app, db):
+    """Test REST API item availability."""
+    today = datetime.date.today()
+
+    item = Item.create({})
+    circulation_item_minter(item.id, item)
+    item.request_item(**RequestItemSchema().dump({
+        'start_date': today + datetime.timedelta(days=10),
+        'end_date': today + datetime.timedelta(days=20),
+    }).data)
+    item.commit()
+    db.session.commit()
+
+    with app.test_request_context():
+        with app.test_client() as client:
+            url = url_for('circulation_rest.crcitm_availability',
+                          pid_value=item['control_number'])
+            res = client.get(url, query_string={
+                'end_date': (today + datetime.timedelta(days=30)).isoformat(),
+            })
+            assert res.status_code == 200
+            available = json.loads(res.data.decode('utf-8'))['available']
+            assert available == [
+                {'start_date': today.isoformat(),
+                 'end_date': str(today + datetime.timedelta(days=9))},
+                {'start_date': str(today + datetime.timedelta(days=21)),
+                 'end_date': str(today + datetime.timedelta(days=30))},
+            ]
+
+            res = client.get(url, query_string={'start_date': 'foo'})
+            assert res.status_code == 400
+
+
+def test_item_state_read_only(app, db):
+    """Test that the circulation state of the items cannot be changed."""
+    item = Item.create({})
+    circulation_item_minter(item.id, item)
+    item.commit()
+    db.session.commit()
+
+    assert 'circulation_rest.crcitmst_availability' not in app.view_functions
+
+    with app.test_request_context():
+        with app.test_client() as client:
+            headers = [('Content-Type', 'application/json')]
+            url = url_for('circulation_rest.crcitmst_list')
+            res = client.post(url, data=json.dumps({}), headers=headers)
+            assert res.status_code == 401
+
+            url = url_for('circulation_rest.crcitmst_item',
+                          pid_value=item['control_number'])
+            res = client.put(url, data=json.dumps({}), headers=headers)
+            assert res.status_code == 401
+            res = client.delete(url)
+            assert res.status_code == 401
+
+            assert Item.get_record(item.id)
+
+
+def test_user_holdings(app, db, access_token):
+    """Test REST API user holdings."""
+    user_id = Token.query.filter_by(access_token=access_token).one().user_id
+
+    item1 = Item.create({'title_statement': {'title': 'Foo'}})
+    circulation_item_minter(item1.id, item1)
+    item1.loan_item(user_id=user_id)
+    item1.request_item(user_id=user_id + 1)
+    item1.commit()
+    item2 = Item.create({})
+    circulation_item_minter(item2.id, item2)
+    item2.request_item(user_id=user_id)
+    item2.commit()
+    # Neither a deleted PID nor a deleted item is listed
+    PersistentIdentifier.create('crcitm', 'deleted', object_type='rec',
+                                object_uuid=item1.id,
+                                status=PIDStatus.DELETED)
+    item3 = Item.create({})
+    circulation_item_minter(item3.id, item3)
+    item3.loan_item(user_id=user_id)
+    item3.commit()
+    item3.delete()
+    db.session.commit()
+
+    with app.test_request_context():
+        with app.test_client() as client:
+            url = url_for('circulation_rest.user_holdings', user_id=user_id)
+            query = {'access_token': access_token}
+
+            res = client.get(url, query_string=dict(query, kind='loan'))
+            assert res.status_code == 200
+            data = json.loads(res.data.decode('utf-8'))
+            assert data['hits']['total'] == 1
+            [loan] = data['hits']['hits']
+            assert loan['kind'] == 'loan'
+            assert loan['item'] == {'pid': item1['control_number'],
+                                    'title': 'Foo'}
+
+            res = client.get(url, query_string=dict(query, kind='request',
+                                                    size=1))
+            data = json.loads(res.data.decode('utf-8'))
+            assert data['hits']['total'] == 1
+            assert data['hits']['hits'][0]['item']['pid'] == \
+                item2['control_number']
+            assert 'next' not in data['links']
+
+            res = client.get(url, query_string=dict(query, size=1))
+            data = json.loads(res.data.decode('utf-8'))
+            assert data['hits']['total'] == 2
+            assert len(data['hits']['hits']) == 1
+            assert 'next' in data['links']
+
+            res = client.get(url, query_string=dict(query, kind='foo'))
+            assert res.status_code == 400
+
+            url = url_for('circulation_rest.user_holdings',
+                          user_id=user_id + 1)
+            res = client.get(url, query_string=query)
+            assert res.status_code == 403
@@ -32,8 +32,8 @@ import pytest
 
 from invenio_circulation.api import Item, ItemStatus
 from invenio_circulation.validators import CancelItemSchema, \
-    ExtendItemSchema, LoanItemSchema, RequestItemSchema, ReturnItemSchema, \
-    ReturnMissingItemSchema
+    ExtendItemSchema, HoldingIntervals, LoanItemSchema, RequestItemSchema, \
+    ReturnItemSchema, ReturnMissingItemSchema
 
 
 def test_loan_item_marshmallow(app, db):
@@ -73,6 +73,22 @@ def test_loan_item_marshmallow(app, db):
     assert '_schema' in errors
 
 
+def test_schema_today(app, db):
+    """Test that a long-lived schema takes the current date per load."""
+    item = Item.create({})
+    db.session.commit()
+
+    today = [datetime.date(2016, 1, 1)]
+    app.extensions['invenio-circulation'].init_policy(
+        app, today=lambda: today[0])
+
+    schema = LoanItemSchema(context={'item': item})
+    assert not schema.validate({'start_date': datetime.date(2016, 1, 1)})
+    today[0] = datetime.date(2016, 1, 2)
+    errors = schema.validate({'start_date': datetime.date(2016, 1, 1)})
+    assert 'start_date' in errors
+
+
 def test_request_item_marshmallow(app, db):
     """Use LoanItemSchema to validate request_item parameters."""
     item = Item.create({})
@@ -252,3 +268,56 @@ def test_blocking_holds(app, db,
     item.commit()
     errors = circulation_event_schema.validate(validate_arguments)
     assert assert_statement(errors)
+
+
+def test_holding_intervals(app):
+    """Test the lookup of overlapping holdings."""
+    today = datetime.date.today()
+
+    def _holding(id_, start, end):
+        return {
+            'id': id_,
+            'start_date': (today + datetime.timedelta(days=start)).isoformat(),
+            'end_date': (today + datetime.timedelta(days=end)).isoformat(),
+        }
+
+    intervals = HoldingIntervals([
+        _holding('a', 10, 20),
+        _holding('b', 0, 5),
+        _holding('c', 30, 40),
+        {'id': 'd'},
+    ])
+    assert len(intervals) == 3
+
+    def _overlaps(start, end):
+        return [(id_, interval.lower - today, interval.upper - today)
+                for id_, interval in intervals.overlaps(
+                    today + datetime.timedelta(days=start),
+                    today + datetime.timedelta(days=end))]
+
+    days = datetime.timedelta
+    assert _overlaps(6, 9) == []
+    assert _overlaps(41, 50) == []
+    assert _overlaps(5, 10) == [('a', days(10), days(10)),
+                                ('b', days(5), days(5))]
+    assert _overlaps(15, 35) == [('a', days(15), days(20)),
+                                 ('c', days(30), days(35))]
+
+
+def test_circulation_policy_clock(app, db):
+    """Test the validation against an injected current date."""
+    item = Item.create({})
+    db.session.commit()
+
+    today = datetime.date(2016, 1, 1)
+    app.extensions['invenio-circulation'].init_policy(app, today=lambda: today)
+
+    schema = LoanItemSchema(context={'item': item})
+    assert not schema.validate({'start_date': today})
+    assert 'start_date' in schema.validate(
+        {'start_date': today + datetime.timedelta(days=1)})
+    assert '_schema' in schema.validate({
+        'start_date': today,
+        'end_date': today + datetime.timedelta(
+            days=app.config['CIRCULATION_LOAN_PERIOD'] + 1),
+    })
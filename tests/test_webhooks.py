@@ -27,13 +27,20 @@
 
 import datetime
 import json
+import threading
+import time
 import uuid
 
 from flask import url_for
+from invenio_records.models import RecordMetadata
+from invenio_webhooks.models import Event
+from sqlalchemy.orm.exc import StaleDataError
 
 from invenio_circulation.api import Item
 from invenio_circulation.minters import circulation_item_minter
-from invenio_circulation.models import ItemStatus
+from invenio_circulation.models import CirculationIdempotencyKey, ItemStatus
+from invenio_circulation.receivers import LoanReceiver, event_queue
+from invenio_circulation.tasks import process_event
 
 
 def test_receiver_base(app, db, access_token):
@@ -240,3 +247,335 @@ def test_dry_run(app, db, access_token):
                               content_type='application/json')
 
             assert res.status_code == 400
+
+            # A false string is not a dry run
+            data = {
+                'item_id': pid.pid_value,
+                'dry_run': 'false',
+            }
+            res = client.post(url, data=json.dumps(data),
+                              content_type='application/json')
+
+            assert res.status_code == 202
+            item = Item.get_record(item.id)
+            assert item['_circulation']['status'] == ItemStatus.ON_LOAN
+
+
+def test_receiver_retry(app, db, access_token, monkeypatch):
+    """Test that conflicting circulation events are retried."""
+    item_uuid = uuid.uuid4()
+    item_data = {}
+    pid = circulation_item_minter(item_uuid, item_data)
+    item = Item.create(item_data, id_=item_uuid)
+    db.session.commit()
+
+    calls = []
+    process = LoanReceiver._process
+
+    def _process(self, event):
+        calls.append(event.id)
+        if len(calls) == 1:
+            raise StaleDataError()
+        return process(self, event)
+
+    monkeypatch.setattr(LoanReceiver, '_process', _process)
+    app.config['CIRCULATION_RECEIVER_RETRY_BACKOFF'] = 0
+
+    with app.test_request_context():
+        with app.test_client() as client:
+            url = url_for('invenio_webhooks.event_list',
+                          receiver_id='circulation_loan')
+            url += '?access_token=' + access_token
+            data = {'item_id': pid.pid_value}
+            res = client.post(url, data=json.dumps(data),
+                              content_type='application/json')
+
+            assert res.status_code == 202
+            assert len(calls) == 2
+
+            item = Item.get_record(item.id)
+            assert item['_circulation']['status'] == ItemStatus.ON_LOAN
+            assert len(item['_circulation']['holdings']) == 1
+
+
+def test_receiver_deadlock_retry(app, db, access_token, monkeypatch):
+    """Test that an event chosen as deadlock victim is retried."""
+    pids = []
+    for _ in range(2):
+        item_uuid = uuid.uuid4()
+        item_data = {}
+        pids.append(circulation_item_minter(item_uuid, item_data))
+        Item.create(item_data, id_=item_uuid)
+    db.session.commit()
+    # The items of an event are locked in the order of their PIDs
+    pid_a, pid_b = sorted(pids, key=lambda pid: pid.pid_value)
+
+    table = RecordMetadata.__table__
+    conn = db.engine.connect()
+    trans = conn.begin()
+
+    def lock(pid):
+        conn.execute(table.select().where(
+            table.c.id == pid.object_uuid).with_for_update())
+
+    # Another transaction holds item B and waits for item A, after the
+    # event has locked A and started waiting for B.
+    locked_a = threading.Event()
+
+    def other_transaction():
+        locked_a.wait(10)
+        time.sleep(0.5)
+        lock(pid_a)
+        trans.commit()
+        conn.close()
+
+    lock(pid_b)
+    thread = threading.Thread(target=other_transaction)
+    thread.daemon = True
+    thread.start()
+
+    calls = []
+    get_record_by_pid = Item.get_record_by_pid
+
+    def _get_record_by_pid(cls, pid_value, for_update=False):
+        record = get_record_by_pid(pid_value, for_update=for_update)
+        calls.append(pid_value)
+        locked_a.set()
+        return record
+
+    monkeypatch.setattr(Item, 'get_record_by_pid',
+                        classmethod(_get_record_by_pid))
+    app.config['CIRCULATION_RECEIVER_RETRY_BACKOFF'] = 0.2
+
+    with app.test_request_context():
+        with app.test_client() as client:
+            url = url_for('invenio_webhooks.event_list',
+                          receiver_id='circulation_loan')
+            url += '?access_token=' + access_token
+            data = {'item_ids': [pid_a.pid_value, pid_b.pid_value]}
+            res = client.post(url, data=json.dumps(data),
+                              content_type='application/json')
+            thread.join(10)
+
+            assert res.status_code == 202
+            # Item A was locked again after the deadlock released it
+            assert calls == [pid_a.pid_value, pid_a.pid_value,
+                             pid_b.pid_value]
+            for pid in pids:
+                item = Item.get_record(pid.object_uuid)
+                assert item['_circulation']['status'] == ItemStatus.ON_LOAN
+
+
+def test_receiver_async(app, db, access_token, monkeypatch):
+    """Test the dispatching of circulation events to Celery."""
+    item_uuid = uuid.uuid4()
+    item_data = {}
+    pid = circulation_item_minter(item_uuid, item_data)
+    item = Item.create(item_data, id_=item_uuid)
+    db.session.commit()
+
+    tasks = []
+    monkeypatch.setattr(process_event, 'apply_async',
+                        lambda args, queue: tasks.append((args, queue)))
+    app.config['CIRCULATION_RECEIVER_ASYNC'] = True
+
+    with app.test_request_context():
+        with app.test_client() as client:
+            url = url_for('invenio_webhooks.event_list',
+                          receiver_id='circulation_loan')
+            url += '?access_token=' + access_token
+            res = client.post(url, data=json.dumps({}),
+                              content_type='application/json')
+            assert res.status_code == 400
+            assert tasks == []
+
+            data = {'item_id': pid.pid_value}
+            res = client.post(url, data=json.dumps(data),
+                              content_type='application/json')
+            assert res.status_code == 202
+            status_url = json.loads(res.data.decode('utf-8'))['links'][
+                'status']
+
+            [(args, queue)] = tasks
+            assert queue == event_queue(pid.pid_value)
+            assert queue.startswith('circulation.')
+
+            status_url += '?access_token=' + access_token
+            res = client.get(status_url)
+            assert json.loads(res.data.decode('utf-8'))['status'] == 202
+
+            process_event(*args)
+
+            res = client.get(status_url)
+            assert json.loads(res.data.decode('utf-8'))['status'] == 200
+
+            item = Item.get_record(item.id)
+            assert item['_circulation']['status'] == ItemStatus.ON_LOAN
+
+
+def test_receiver_async_basket(app, db, access_token, monkeypatch):
+    """Test the split of an asynchronous basket by partition."""
+    pids = []
+    for _ in range(4):
+        item_uuid = uuid.uuid4()
+        item_data = {}
+        pids.append(circulation_item_minter(item_uuid, item_data))
+        Item.create(item_data, id_=item_uuid)
+    db.session.commit()
+
+    tasks = []
+    monkeypatch.setattr(process_event, 'apply_async',
+                        lambda args, queue: tasks.append((args, queue)))
+    app.config['CIRCULATION_RECEIVER_ASYNC'] = True
+    app.config['CIRCULATION_RECEIVER_PARTITIONS'] = 2
+
+    item_ids = [pid.pid_value for pid in pids]
+    partitions = {}
+    for item_id in item_ids:
+        partitions.setdefault(event_queue(item_id), []).append(item_id)
+
+    with app.test_request_context():
+        with app.test_client() as client:
+            url = url_for('invenio_webhooks.event_list',
+                          receiver_id='circulation_loan')
+            url += '?access_token=' + access_token
+            res = client.post(url, data=json.dumps({'item_ids': item_ids}),
+                              content_type='application/json')
+            assert res.status_code == 202
+            response = json.loads(res.data.decode('utf-8'))
+
+            assert len(tasks) == len(partitions)
+            if len(partitions) > 1:
+                assert [e['item_ids'] for e in response['events']] == \
+                    [partitions[queue] for queue in sorted(partitions)]
+            for args, queue in tasks:
+                event = Event.query.get(args[0])
+                assert event.payload['item_ids'] == partitions[queue]
+                process_event(*args)
+
+            for pid in pids:
+                item = Item.get_record(pid.object_uuid)
+                assert item['_circulation']['status'] == ItemStatus.ON_LOAN
+
+
+def test_multi_item_receiver(app, db, access_token):
+    """Test the loan of several items with a single event."""
+    pids = []
+    for _ in range(3):
+        item_uuid = uuid.uuid4()
+        item_data = {}
+        pids.append(circulation_item_minter(item_uuid, item_data))
+        Item.create(item_data, id_=item_uuid)
+    item = Item.get_record(pids[2].object_uuid)
+    item.lose_item()
+    item.commit()
+    db.session.commit()
+
+    with app.test_request_context():
+        with app.test_client() as client:
+            url = url_for('invenio_webhooks.event_list',
+                          receiver_id='circulation_loan')
+            url += '?access_token=' + access_token
+            item_ids = [pid.pid_value for pid in pids] + ['does-not-exist']
+            res = client.post(url, data=json.dumps({'item_ids': item_ids}),
+                              content_type='application/json')
+
+            assert res.status_code == 207
+            results = json.loads(res.data.decode('utf-8'))['items']
+            assert [r['item_id'] for r in results] == item_ids
+            assert [r['status'] for r in results] == [202, 202, 400, 404]
+
+            for pid in pids[:2]:
+                item = Item.get_record(pid.object_uuid)
+                assert item['_circulation']['status'] == ItemStatus.ON_LOAN
+
+
+def test_dry_run_without_lock(app, db, access_token, monkeypatch):
+    """Test that dry runs are validated without loading the items."""
+    item_uuid = uuid.uuid4()
+    item_data = {}
+    pid = circulation_item_minter(item_uuid, item_data)
+    Item.create(item_data, id_=item_uuid)
+    db.session.commit()
+
+    def get_record_by_pid(*args, **kwargs):
+        raise AssertionError('The item must not be loaded.')
+
+    monkeypatch.setattr(Item, 'get_record_by_pid', get_record_by_pid)
+
+    with app.test_request_context():
+        with app.test_client() as client:
+            url = url_for('invenio_webhooks.event_list',
+                          receiver_id='circulation_return')
+            url += '?access_token=' + access_token
+            data = {
+                'item_ids': [pid.pid_value, 'does-not-exist'],
+                'dry_run': True,
+            }
+            res = client.post(url, data=json.dumps(data),
+                              content_type='application/json')
+
+            assert res.status_code == 400
+            results = json.loads(res.data.decode('utf-8'))['items']
+            assert [r['status'] for r in results] == [400, 404]
+
+            data = {'item_id': pid.pid_value, 'dry_run': True}
+            url = url_for('invenio_webhooks.event_list',
+                          receiver_id='circulation_loan')
+            url += '?access_token=' + access_token
+            res = client.post(url, data=json.dumps(data),
+                              content_type='application/json')
+            assert res.status_code == 204
+
+            data = {'item_ids': [pid.pid_value], 'dry_run': True}
+            res = client.post(url, data=json.dumps(data),
+                              content_type='application/json')
+            assert res.status_code == 204
+
+            data = {'item_ids': [pid.pid_value, 'does-not-exist'],
+                    'dry_run': True}
+            res = client.post(url, data=json.dumps(data),
+                              content_type='application/json')
+            assert res.status_code == 207
+            results = json.loads(res.data.decode('utf-8'))['items']
+            assert [r['status'] for r in results] == [204, 404]
+
+
+def test_idempotency_key(app, db, access_token):
+    """Test that repeated events with the same key are not processed."""
+    item_uuid = uuid.uuid4()
+    item_data = {}
+    pid = circulation_item_minter(item_uuid, item_data)
+    item = Item.create(item_data, id_=item_uuid)
+    db.session.commit()
+
+    with app.test_request_context():
+        with app.test_client() as client:
+            url = url_for('invenio_webhooks.event_list',
+                          receiver_id='circulation_request')
+            url += '?access_token=' + access_token
+            data = {'item_id': pid.pid_value}
+            headers = {'Idempotency-Key': 'request-1'}
+
+            for _ in range(2):
+                res = client.post(url, data=json.dumps(data),
+                                  headers=headers,
+                                  content_type='application/json')
+                assert res.status_code == 202
+
+            item = Item.get_record(item.id)
+            assert len(item['_circulation']['holdings']) == 1
+
+            # Once the key has expired the event is processed again
+            stored = CirculationIdempotencyKey.query.one()
+            stored.created -= app.config['CIRCULATION_IDEMPOTENCY_TTL']
+            db.session.commit()
+
+            start_date = datetime.date.today() + datetime.timedelta(days=60)
+            data['start_date'] = str(start_date)
+            res = client.post(url, data=json.dumps(data), headers=headers,
+                              content_type='application/json')
+            assert res.status_code == 202
+
+            item = Item.get_record(item.id)
+            assert len(item['_circulation']['holdings']) == 2